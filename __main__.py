@@ -15,6 +15,12 @@ import os
 import json
 from dotenv import load_dotenv
 
+from utils.blacklist import BlacklistService
+from utils.logs import setup_logging
+from utils.pipeline import MessagePipeline
+from utils.prefixes import PrefixRegistry
+from utils.storage import Storage
+
 # Load environment variables
 load_dotenv()
 
@@ -29,21 +35,8 @@ async def _prefix_callable(bot: commands.AutoShardedBot, message: discord.Messag
     if not message.guild:
         return ['-']
     
-    # Load prefixes from JSON file
-    try:
-        with open('data/prefixes.json', 'r') as f:
-            prefixes = json.load(f)
-        prefix = prefixes.get(str(message.guild.id), '-')
-    except (FileNotFoundError, json.JSONDecodeError):
-        prefix = '-'
-    
-    base = [
-        f'<@{bot.user.id}>',
-        f'<@!{bot.user.id}>',
-        prefix
-    ]
-    
-    return base
+    # Served from memory, the registry only re-reads the file when it changes
+    return bot.prefixes.resolve(bot.user.id, message.guild.id)
 #BUTTON CLASS FOR PERSISTANCE-------------------------------------------------------------------------
 class Ticket(discord.ui.View):
     def __init__(self):
@@ -341,39 +334,49 @@ class Bot(commands.AutoShardedBot):
                 748552378504052878 # pandey
             ]
         )
+        self.prefixes = PrefixRegistry('data/prefixes.json')
+        self.blacklist = BlacklistService('data/blacklist.json')
+        self.storage = Storage('data/police_agent.db')
+        self.log_listener = setup_logging()
+        # Every message goes through one pipeline instead of a listener per cog
+        self.pipeline = MessagePipeline(self)
+        self.pipeline.register('commands', self._command_stage, priority=100, predicate=self._is_allowed_command)
         self.add_check(self.blacklisted_check)
     
     async def blacklisted_check(self, ctx: commands.Context):
         # bot owners bypass this
-        if await bot.is_owner(ctx.author):
+        if await self.is_owner(ctx.author):
             return True
 
-        # Load blacklist from JSON file
-        try:
-            with open('data/blacklist.json', 'r') as f:
-                blacklist = json.load(f)
-            if str(ctx.author.id) in blacklist:
-                delete_after: int = 7
-                
-                embed = discord.Embed(
-                    description='Unfortunately, you have been blacklisted from the bot. If you wish to know why or appeal, please join **[this server](https://discord.gg/xRquATkezz)**.'
-                )
-                await ctx.reply(
-                    embed=embed,
-                    delete_after=delete_after
-                )
-                await ctx.message.delete(delay=delete_after)
+        if ctx.author.id in self.blacklist:
+            delete_after: int = 7
+            
+            embed = discord.Embed(
+                description='Unfortunately, you have been blacklisted from the bot. If you wish to know why or appeal, please join **[this server](https://discord.gg/xRquATkezz)**.'
+            )
+            await ctx.reply(
+                embed=embed,
+                delete_after=delete_after
+            )
+            await ctx.message.delete(delay=delete_after)
 
-                return False
-            else: # everything is normal, not blacklisted
-                return True
-        except (FileNotFoundError, json.JSONDecodeError):
-            # If blacklist file doesn't exist or is invalid, allow the command
-            return True
+            return False
+        
+        # everything is normal, not blacklisted
+        return True
     
     async def on_message(self, message):
-        """Main message handler to process commands"""
-        await self.process_commands(message)
+        """Main message handler, runs the message pipeline"""
+        await self.pipeline.dispatch(message)
+    
+    def _is_allowed_command(self, ctx):
+        # Blacklisted users are dropped before command parsing, bots never run commands
+        if ctx.is_bot or not ctx.is_command:
+            return False
+        return ctx.author_id not in self.blacklist or ctx.author_id in self.owner_ids
+    
+    async def _command_stage(self, ctx):
+        await self.process_commands(ctx.message)
     
     @tasks.loop(minutes=1)
     async def change_status(self):
@@ -390,6 +393,11 @@ class Bot(commands.AutoShardedBot):
     async def _before_change_status(self):
         await self.wait_until_ready()
 
+    @tasks.loop(minutes=30)
+    async def checkpoint_storage(self):
+        # Writes are single-row appends to the WAL, this folds them back into the database file
+        await self.storage.checkpoint()
+
     async def _startup_task(self):
         print(f'Logged in as {self.user} (ID: {self.user.id})')
         print('------')
@@ -411,6 +419,7 @@ class Bot(commands.AutoShardedBot):
                 traceback.print_exc()
 
         self.change_status.start()
+        self.checkpoint_storage.start()
     
     async def _create_data_files(self):
         """Create necessary data files if they don't exist"""
@@ -429,30 +438,29 @@ class Bot(commands.AutoShardedBot):
             with open('data/blacklist.json', 'w') as f:
                 json.dump([], f)
         
-        # Create captcha_data.json if it doesn't exist
-        if not os.path.exists('data/captcha_data.json'):
-            with open('data/captcha_data.json', 'w') as f:
-                json.dump({}, f)
-        
-        # Create verification_cooldown.json if it doesn't exist
-        if not os.path.exists('data/verification_cooldown.json'):
-            with open('data/verification_cooldown.json', 'w') as f:
-                json.dump({}, f)
-        
-        # Create warnings.json if it doesn't exist
-        if not os.path.exists('data/warnings.json'):
-            with open('data/warnings.json', 'w') as f:
-                json.dump({}, f)
+        # Captchas, verification cooldowns and warnings live in SQLite
+        await self.storage.open()
+        imported = await self.storage.import_legacy_json('data')
+        if imported:
+            print('Imported {} captchas, {} cooldowns and warnings for {} users from JSON.'.format(*imported))
         
         print('Data files initialized.')
 
     async def setup_hook(self) -> None:
-        asyncio.create_task(self._startup_task())
+        # Storage has to be open before any extension is loaded
         await self._create_data_files()
+        asyncio.create_task(self._startup_task())
         self.add_view(Verify())
         self.add_view(Ticket())
         self.add_view(TicketClose())
         self.add_view(SelfRoles())
+    
+    async def close(self) -> None:
+        self.checkpoint_storage.cancel()
+        await super().close()
+        await self.storage.close()
+        # Flushes whatever is still queued for the log writer
+        self.log_listener.stop()
         
     def run(self):
         super().run(
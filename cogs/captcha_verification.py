@@ -1,229 +1,86 @@
 import discord
 from discord.ext import commands, tasks
-import json
-import random
-import string
 import asyncio
-from datetime import datetime, timedelta
-import os
-from PIL import Image, ImageDraw, ImageFont
+from datetime import timedelta
 import io
 import base64
+import os
+
+from utils.captcha_render import CaptchaRenderer
+from utils.captcha_sessions import CaptchaSessionStore
+from utils.cooldowns import CooldownManager
+from utils.logs import get_logger
 
 class CaptchaVerification(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.captcha_data_file = 'data/captcha_data.json'
-        self.cooldown_data_file = 'data/verification_cooldown.json'
-        self.cleanup_task.start()
-    
-    def cog_unload(self):
-        self.cleanup_task.cancel()
-    
-    def generate_captcha(self):
-        """Generate a random captcha string"""
-        return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        self.log = get_logger('captcha_verification')
+        self.cooldowns = CooldownManager(bot.storage)
+        self.sessions = CaptchaSessionStore(bot.storage, ttl=int(os.getenv('CAPTCHA_TTL_SECONDS', '600')))
+        self.renderer = CaptchaRenderer(
+            pool_size=int(os.getenv('CAPTCHA_POOL_SIZE', '20')),
+            workers=int(os.getenv('CAPTCHA_WORKERS', '2'))
+        )
     
-    def generate_captcha_image(self, captcha_text):
-        """Generate a captcha image with the given text"""
-        # Create image with random background
-        width, height = 200, 80
-        bg_colors = [
-            (240, 248, 255),  # Alice Blue
-            (255, 250, 240),  # Floral White
-            (245, 245, 220),  # Beige
-            (255, 255, 240),  # Ivory
-            (248, 248, 255),  # Ghost White
-        ]
-        bg_color = random.choice(bg_colors)
-        
-        # Create image
-        image = Image.new('RGB', (width, height), bg_color)
-        draw = ImageDraw.Draw(image)
-        
-        # Add random noise lines
-        for _ in range(random.randint(8, 15)):
-            x1 = random.randint(0, width)
-            y1 = random.randint(0, height)
-            x2 = random.randint(0, width)
-            y2 = random.randint(0, height)
-            line_color = (random.randint(100, 200), random.randint(100, 200), random.randint(100, 200))
-            draw.line([(x1, y1), (x2, y2)], fill=line_color, width=random.randint(1, 3))
-        
-        # Add random noise dots
-        for _ in range(random.randint(50, 100)):
-            x = random.randint(0, width)
-            y = random.randint(0, height)
-            dot_color = (random.randint(150, 220), random.randint(150, 220), random.randint(150, 220))
-            draw.point((x, y), fill=dot_color)
-        
-        # Try to use a font, fallback to default if not available
-        try:
-            # Try different font sizes
-            font_size = random.randint(24, 32)
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except:
-            try:
-                font = ImageFont.load_default()
-            except:
-                font = None
-        
-        # Draw the captcha text with random positioning and colors
-        text_color = (random.randint(0, 100), random.randint(0, 100), random.randint(0, 100))
-        
-        # Calculate text position (center it roughly)
-        if font:
-            bbox = draw.textbbox((0, 0), captcha_text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-        else:
-            text_width = len(captcha_text) * 10
-            text_height = 20
-        
-        x = (width - text_width) // 2 + random.randint(-10, 10)
-        y = (height - text_height) // 2 + random.randint(-5, 5)
-        
-        # Draw text with slight rotation
-        angle = random.randint(-15, 15)
-        
-        # Create a temporary image for rotation
-        temp_img = Image.new('RGBA', (text_width + 20, text_height + 20), (0, 0, 0, 0))
-        temp_draw = ImageDraw.Draw(temp_img)
-        
-        if font:
-            temp_draw.text((10, 10), captcha_text, fill=text_color, font=font)
-        else:
-            temp_draw.text((10, 10), captcha_text, fill=text_color)
-        
-        # Rotate the text
-        rotated = temp_img.rotate(angle, expand=1)
-        
-        # Paste rotated text onto main image
-        image.paste(rotated, (x-10, y-10), rotated)
-        
-        # Add some distortion lines
-        for _ in range(random.randint(3, 6)):
-            x1 = random.randint(0, width)
-            y1 = random.randint(0, height)
-            x2 = random.randint(0, width)
-            y2 = random.randint(0, height)
-            line_color = (random.randint(200, 255), random.randint(200, 255), random.randint(200, 255))
-            draw.line([(x1, y1), (x2, y2)], fill=line_color, width=1)
-        
-        # Convert to bytes
-        img_bytes = io.BytesIO()
-        image.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
+    async def cog_load(self):
+        await self.cooldowns.load()
+        await self.sessions.load()
+        self.renderer.start()
+        self.cleanup_task.start()
         
-        return img_bytes
-    
-    def load_captcha_data(self):
-        """Load captcha data from JSON file"""
-        try:
-            if os.path.exists(self.captcha_data_file):
-                with open(self.captcha_data_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
-    
-    def save_captcha_data(self, data):
-        """Save captcha data to JSON file"""
-        os.makedirs('data', exist_ok=True)
-        with open(self.captcha_data_file, 'w') as f:
-            json.dump(data, f, indent=2)
-    
-    def load_cooldown_data(self):
-        """Load cooldown data from JSON file"""
-        try:
-            if os.path.exists(self.cooldown_data_file):
-                with open(self.cooldown_data_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
+        # Captcha answers are consumed before rule scanning and command parsing
+        self.bot.pipeline.register(
+            'captcha_answer', self.handle_answer_stage, priority=10,
+            predicate=lambda ctx: not ctx.is_bot and ctx.author_id in self.sessions.open_users,
+            owner=self
+        )
     
-    def save_cooldown_data(self, data):
-        """Save cooldown data to JSON file"""
-        os.makedirs('data', exist_ok=True)
-        with open(self.cooldown_data_file, 'w') as f:
-            json.dump(data, f, indent=2)
+    async def cog_unload(self):
+        self.bot.pipeline.unregister_owner(self)
+        self.cleanup_task.cancel()
+        await self.renderer.close()
     
     def is_on_cooldown(self, user_id):
         """Check if user is on cooldown"""
-        cooldown_data = self.load_cooldown_data()
-        user_id_str = str(user_id)
-        
-        if user_id_str not in cooldown_data:
-            return False
-        
-        cooldown_end = datetime.fromisoformat(cooldown_data[user_id_str]['cooldown_end'])
-        return datetime.now() < cooldown_end
+        return user_id in self.cooldowns
     
     def get_cooldown_remaining(self, user_id):
         """Get remaining cooldown time for user"""
-        cooldown_data = self.load_cooldown_data()
-        user_id_str = str(user_id)
-        
-        if user_id_str not in cooldown_data:
-            return None
-        
-        cooldown_end = datetime.fromisoformat(cooldown_data[user_id_str]['cooldown_end'])
-        remaining = cooldown_end - datetime.now()
-        return remaining if remaining.total_seconds() > 0 else None
+        remaining = self.cooldowns.remaining(user_id)
+        return timedelta(seconds=remaining) if remaining is not None else None
     
-    def add_cooldown(self, user_id, hours=3):
+    async def add_cooldown(self, user_id, hours=3):
         """Add user to cooldown"""
-        cooldown_data = self.load_cooldown_data()
-        user_id_str = str(user_id)
-        
-        cooldown_end = datetime.now() + timedelta(hours=hours)
-        cooldown_data[user_id_str] = {
-            'cooldown_end': cooldown_end.isoformat(),
-            'added_at': datetime.now().isoformat()
-        }
-        
-        self.save_cooldown_data(cooldown_data)
+        await self.cooldowns.add(user_id, hours * 3600)
     
-    def remove_cooldown(self, user_id):
+    async def remove_cooldown(self, user_id):
         """Remove user from cooldown"""
-        cooldown_data = self.load_cooldown_data()
-        user_id_str = str(user_id)
-        
-        if user_id_str in cooldown_data:
-            del cooldown_data[user_id_str]
-            self.save_cooldown_data(cooldown_data)
+        await self.cooldowns.remove(user_id)
     
-    @tasks.loop(minutes=5)
+    @tasks.loop(minutes=1)
     async def cleanup_task(self):
-        """Clean up expired cooldowns"""
-        cooldown_data = self.load_cooldown_data()
-        current_time = datetime.now()
-        
-        expired_users = []
-        for user_id, data in cooldown_data.items():
-            cooldown_end = datetime.fromisoformat(data['cooldown_end'])
-            if current_time >= cooldown_end:
-                expired_users.append(user_id)
+        """Clean up expired cooldowns and captcha sessions"""
+        expired = await self.cooldowns.expire()
         
-        for user_id in expired_users:
-            del cooldown_data[user_id]
+        if expired:
+            self.log.info('expired verification cooldowns', count=expired)
         
-        if expired_users:
-            self.save_cooldown_data(cooldown_data)
-            print(f"Cleaned up {len(expired_users)} expired verification cooldowns")
+        expired_sessions = await self.sessions.evict_expired()
+        if expired_sessions:
+            self.log.info('expired captcha sessions', count=expired_sessions)
     
     @cleanup_task.before_loop
     async def before_cleanup_task(self):
         await self.bot.wait_until_ready()
     
-    async def send_captcha_dm(self, user, captcha_code):
+    async def send_captcha_dm(self, user, captcha_code, captcha_image=None):
         """Send captcha image to user's DM"""
-        # Generate captcha image
-        img_bytes = self.generate_captcha_image(captcha_code)
+        # Use the pre-rendered image if we have one
+        if captcha_image is None:
+            captcha_image = await self.renderer.render(captcha_code)
         
         # Create file object
-        file = discord.File(img_bytes, filename="captcha.png")
+        file = discord.File(io.BytesIO(captcha_image), filename="captcha.png")
         
         embed = discord.Embed(
             title="🔐 Server Verification Captcha",
@@ -254,8 +111,8 @@ class CaptchaVerification(commands.Cog):
             return
         
         # Check if user is on cooldown
-        if self.is_on_cooldown(user.id):
-            remaining = self.get_cooldown_remaining(user.id)
+        remaining = self.get_cooldown_remaining(user.id)
+        if remaining:
             hours = int(remaining.total_seconds() // 3600)
             minutes = int((remaining.total_seconds() % 3600) // 60)
             
@@ -268,21 +125,14 @@ class CaptchaVerification(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
         
-        # Generate captcha
-        captcha_code = self.generate_captcha()
+        # Take a pre-rendered captcha from the pool
+        captcha_code, captcha_image = await self.renderer.take()
         
         # Store captcha data
-        captcha_data = self.load_captcha_data()
-        captcha_data[str(user.id)] = {
-            'code': captcha_code,
-            'attempts': 0,
-            'max_attempts': 3,
-            'created_at': datetime.now().isoformat()
-        }
-        self.save_captcha_data(captcha_data)
+        await self.sessions.create(user.id, captcha_code, max_attempts=3)
         
         # Try to send DM
-        dm_sent = await self.send_captcha_dm(user, captcha_code)
+        dm_sent = await self.send_captcha_dm(user, captcha_code, captcha_image)
         
         if dm_sent:
             embed = discord.Embed(
@@ -301,30 +151,38 @@ class CaptchaVerification(commands.Cog):
             embed.set_footer(text="Enable DMs from server members")
             await interaction.response.send_message(embed=embed, ephemeral=True)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def handle_answer_stage(self, ctx):
+        """Pipeline stage: a 6 character message from a user with an open captcha is an answer"""
+        if len(ctx.content) != 6 or not ctx.content.isalnum() or self.sessions.get(ctx.author_id) is None:
+            return False
+        
+        await self.handle_captcha_answer(ctx.message)
+        return True
+    
+    async def handle_captcha_answer(self, message):
         """Handle direct captcha input"""
+        # Most traffic comes from users without a captcha, reject them with one set lookup
+        if message.author.id not in self.sessions.open_users:
+            return
+        
         if message.author.bot:
             return
         
         # Check if message looks like a captcha code (6 characters, alphanumeric)
         if len(message.content) == 6 and message.content.isalnum():
-            user_id = str(message.author.id)
-            captcha_data = self.load_captcha_data()
+            user_captcha = self.sessions.get(message.author.id)
             
-            if user_id in captcha_data:
-                user_captcha = captcha_data[user_id]
+            if user_captcha:
                 
                 # Handle DM case
                 if not message.guild:
                     # Check attempts
-                    if user_captcha['attempts'] >= user_captcha['max_attempts']:
+                    if user_captcha.locked_out:
                         # Add to cooldown
-                        self.add_cooldown(message.author.id)
+                        await self.add_cooldown(message.author.id)
                         
                         # Clean up captcha data
-                        del captcha_data[user_id]
-                        self.save_captcha_data(captcha_data)
+                        await self.sessions.end(message.author.id)
                         
                         embed = discord.Embed(
                             title="⏰ Verification Cooldown",
@@ -336,7 +194,7 @@ class CaptchaVerification(commands.Cog):
                         return
                     
                     # Check captcha
-                    if message.content.upper() == user_captcha['code']:
+                    if message.content.upper() == user_captcha.code:
                         # Success! Find the guild and give verified role
                         # We need to find which guild the user is in
                         guild = None
@@ -353,8 +211,7 @@ class CaptchaVerification(commands.Cog):
                                     await member.add_roles(verified_role)
                                 
                                 # Clean up captcha data
-                                del captcha_data[user_id]
-                                self.save_captcha_data(captcha_data)
+                                await self.sessions.end(message.author.id)
                                 
                                 # Send success DM
                                 embed = discord.Embed(
@@ -380,11 +237,8 @@ class CaptchaVerification(commands.Cog):
                             await message.reply(embed=embed)
                     else:
                         # Wrong captcha
-                        user_captcha['attempts'] += 1
-                        remaining_attempts = user_captcha['max_attempts'] - user_captcha['attempts']
-                        
-                        captcha_data[user_id] = user_captcha
-                        self.save_captcha_data(captcha_data)
+                        user_captcha.attempts += 1
+                        remaining_attempts = user_captcha.remaining_attempts
                         
                         if remaining_attempts > 0:
                             embed = discord.Embed(
@@ -396,11 +250,10 @@ class CaptchaVerification(commands.Cog):
                             await message.reply(embed=embed)
                         else:
                             # Add to cooldown
-                            self.add_cooldown(message.author.id)
+                            await self.add_cooldown(message.author.id)
                             
                             # Clean up captcha data
-                            del captcha_data[user_id]
-                            self.save_captcha_data(captcha_data)
+                            await self.sessions.end(message.author.id)
                             
                             embed = discord.Embed(
                                 title="⏰ Verification Cooldown",
@@ -427,8 +280,7 @@ class CaptchaVerification(commands.Cog):
                     # Check if user is already verified
                     if verified_role in message.author.roles:
                         # Clean up captcha data
-                        del captcha_data[user_id]
-                        self.save_captcha_data(captcha_data)
+                        await self.sessions.end(message.author.id)
                         embed = discord.Embed(
                             title="✅ Already Verified",
                             description="You are already verified!",
@@ -438,13 +290,12 @@ class CaptchaVerification(commands.Cog):
                         return
                     
                     # Check attempts
-                    if user_captcha['attempts'] >= user_captcha['max_attempts']:
+                    if user_captcha.locked_out:
                         # Add to cooldown
-                        self.add_cooldown(message.author.id)
+                        await self.add_cooldown(message.author.id)
                         
                         # Clean up captcha data
-                        del captcha_data[user_id]
-                        self.save_captcha_data(captcha_data)
+                        await self.sessions.end(message.author.id)
                         
                         embed = discord.Embed(
                             title="⏰ Verification Cooldown",
@@ -456,13 +307,12 @@ class CaptchaVerification(commands.Cog):
                         return
                     
                     # Check captcha
-                    if message.content.upper() == user_captcha['code']:
+                    if message.content.upper() == user_captcha.code:
                         # Success! Give verified role
                         await message.author.add_roles(verified_role)
                         
                         # Clean up captcha data
-                        del captcha_data[user_id]
-                        self.save_captcha_data(captcha_data)
+                        await self.sessions.end(message.author.id)
                         
                         embed = discord.Embed(
                             title="✅ Verification Successful!",
@@ -498,11 +348,8 @@ class CaptchaVerification(commands.Cog):
                             await message.reply(embed=embed, delete_after=10)
                     else:
                         # Wrong captcha
-                        user_captcha['attempts'] += 1
-                        remaining_attempts = user_captcha['max_attempts'] - user_captcha['attempts']
-                        
-                        captcha_data[user_id] = user_captcha
-                        self.save_captcha_data(captcha_data)
+                        user_captcha.attempts += 1
+                        remaining_attempts = user_captcha.remaining_attempts
                         
                         if remaining_attempts > 0:
                             embed = discord.Embed(
@@ -514,11 +361,10 @@ class CaptchaVerification(commands.Cog):
                             await message.reply(embed=embed, delete_after=5)
                         else:
                             # Add to cooldown
-                            self.add_cooldown(message.author.id)
+                            await self.add_cooldown(message.author.id)
                             
                             # Clean up captcha data
-                            del captcha_data[user_id]
-                            self.save_captcha_data(captcha_data)
+                            await self.sessions.end(message.author.id)
                             
                             embed = discord.Embed(
                                 title="⏰ Verification Cooldown",
@@ -531,10 +377,9 @@ class CaptchaVerification(commands.Cog):
     @commands.command(name="verify_captcha")
     async def verify_captcha(self, ctx, *, captcha_input):
         """Verify captcha input"""
-        user_id = str(ctx.author.id)
-        captcha_data = self.load_captcha_data()
+        user_captcha = self.sessions.get(ctx.author.id)
         
-        if user_id not in captcha_data:
+        if not user_captcha:
             embed = discord.Embed(
                 title="❌ No Active Captcha",
                 description="No active captcha found. Please use the verify button first.",
@@ -543,14 +388,11 @@ class CaptchaVerification(commands.Cog):
             await ctx.reply(embed=embed, delete_after=5)
             return
         
-        user_captcha = captcha_data[user_id]
-        
         # Check if user is already verified
         verified_role = ctx.guild.get_role(903238068910309398)
         if verified_role and verified_role in ctx.author.roles:
             # Clean up captcha data
-            del captcha_data[user_id]
-            self.save_captcha_data(captcha_data)
+            await self.sessions.end(ctx.author.id)
             embed = discord.Embed(
                 title="✅ Already Verified",
                 description="You are already verified!",
@@ -560,13 +402,12 @@ class CaptchaVerification(commands.Cog):
             return
         
         # Check attempts
-        if user_captcha['attempts'] >= user_captcha['max_attempts']:
+        if user_captcha.locked_out:
             # Add to cooldown
-            self.add_cooldown(ctx.author.id)
+            await self.add_cooldown(ctx.author.id)
             
             # Clean up captcha data
-            del captcha_data[user_id]
-            self.save_captcha_data(captcha_data)
+            await self.sessions.end(ctx.author.id)
             
             embed = discord.Embed(
                 title="⏰ Verification Cooldown",
@@ -578,13 +419,12 @@ class CaptchaVerification(commands.Cog):
             return
         
         # Check captcha
-        if captcha_input.upper() == user_captcha['code']:
+        if captcha_input.upper() == user_captcha.code:
             # Success! Give verified role
             await ctx.author.add_roles(verified_role)
             
             # Clean up captcha data
-            del captcha_data[user_id]
-            self.save_captcha_data(captcha_data)
+            await self.sessions.end(ctx.author.id)
             
             embed = discord.Embed(
                 title="✅ Verification Successful!",
@@ -620,11 +460,8 @@ class CaptchaVerification(commands.Cog):
                 await ctx.reply(embed=embed, delete_after=10)
         else:
             # Wrong captcha
-            user_captcha['attempts'] += 1
-            remaining_attempts = user_captcha['max_attempts'] - user_captcha['attempts']
-            
-            captcha_data[user_id] = user_captcha
-            self.save_captcha_data(captcha_data)
+            user_captcha.attempts += 1
+            remaining_attempts = user_captcha.remaining_attempts
             
             if remaining_attempts > 0:
                 embed = discord.Embed(
@@ -636,11 +473,10 @@ class CaptchaVerification(commands.Cog):
                 await ctx.reply(embed=embed, delete_after=5)
             else:
                 # Add to cooldown
-                self.add_cooldown(ctx.author.id)
+                await self.add_cooldown(ctx.author.id)
                 
                 # Clean up captcha data
-                del captcha_data[user_id]
-                self.save_captcha_data(captcha_data)
+                await self.sessions.end(ctx.author.id)
                 
                 embed = discord.Embed(
                     title="⏰ Verification Cooldown",
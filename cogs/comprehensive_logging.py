@@ -4,13 +4,31 @@ import json
 import os
 from datetime import datetime
 import asyncio
+from utils.activity import UserActivity
+from utils.log_dispatcher import BULK, CRITICAL, LANE_NAMES, NORMAL, LogDispatcher
+from utils.logs import get_logger
 
 class ComprehensiveLogging(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.log = get_logger('comprehensive_logging')
         self.log_channel_id = 1419643352986423379
         self.suspicious_activities = {}
         self.user_activity_tracker = {}
+        self.activity_history = int(os.getenv('ACTIVITY_HISTORY', '50'))
+        self.activity_window = int(os.getenv('ACTIVITY_WINDOW_SECONDS', '300'))
+        # Log embeds are buffered per channel and sent up to 10 per message,
+        # critical logs first, bursts of bulk events folded into summaries
+        self.dispatcher = LogDispatcher(
+            linger=int(os.getenv('LOG_BATCH_LINGER_MS', '1500')) / 1000,
+            max_chars=int(os.getenv('LOG_BATCH_MAX_CHARS', '6000')),
+            weights=tuple(int(weight) for weight in os.getenv('LOG_LANE_WEIGHTS', '6,3,1').split(',')),
+            coalesce_after=int(os.getenv('LOG_COALESCE_AFTER', '3'))
+        )
+    
+    async def cog_unload(self):
+        # Runs on shutdown too, since Bot.close unloads every extension first
+        await self.dispatcher.close()
         
     def get_log_channel(self, guild):
         """Get the log channel for the guild"""
@@ -41,65 +59,63 @@ class ComprehensiveLogging(commands.Cog):
         embed.set_footer(text=f"Police Agent Logging System • {current_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
         return embed
     
-    async def send_log(self, guild, embed):
-        """Send log to the designated log channel"""
+    async def send_log(self, guild, embed, lane=NORMAL, key=None, summarize=None):
+        """Queue a log embed for the designated log channel"""
         log_channel = self.get_log_channel(guild)
         if log_channel:
-            try:
-                await log_channel.send(embed=embed)
-            except discord.Forbidden:
-                print(f"Could not send log to channel {self.log_channel_id} - insufficient permissions")
-            except Exception as e:
-                print(f"Error sending log: {e}")
+            self.dispatcher.send(log_channel, embed, lane=lane, key=key, summarize=summarize)
+    
+    def summarize_bulk(self, user, action, title):
+        """Build a summarize callback for a burst of one user's bulk events"""
+        def summarize(count, seconds):
+            minutes = max(1, round(seconds / 60))
+            return self.create_log_embed(
+                title,
+                f"**User:** {user.mention} ({user.name}#{user.discriminator})\n"
+                f"**ID:** {user.id}\n"
+                f"{user.name} {action} {count} times in {minutes} minute{'s' if minutes != 1 else ''}",
+                color=0x0099ff,
+                thumbnail=user.display_avatar.url
+            )
+        return summarize
     
     def track_user_activity(self, user_id, activity_type, details):
         """Track user activity for suspicious behavior detection"""
-        if user_id not in self.user_activity_tracker:
-            self.user_activity_tracker[user_id] = {
-                'activities': [],
-                'warning_count': 0,
-                'last_activity': None
-            }
-        
-        activity = {
-            'type': activity_type,
-            'details': details,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        self.user_activity_tracker[user_id]['activities'].append(activity)
-        self.user_activity_tracker[user_id]['last_activity'] = datetime.now()
-        
-        # Keep only last 50 activities per user
-        if len(self.user_activity_tracker[user_id]['activities']) > 50:
-            self.user_activity_tracker[user_id]['activities'] = self.user_activity_tracker[user_id]['activities'][-50:]
+        tracked = self.user_activity_tracker.get(user_id)
+        if tracked is None:
+            tracked = self.user_activity_tracker[user_id] = UserActivity(
+                history=self.activity_history,
+                windowed=('rule_violation', 'spam'),
+                window=self.activity_window
+            )
+        tracked.add(activity_type, details)
     
     def detect_suspicious_activity(self, user_id, guild_id):
         """Detect suspicious patterns in user behavior"""
-        if user_id not in self.user_activity_tracker:
+        tracked = self.user_activity_tracker.get(user_id)
+        if tracked is None:
             return None
         
-        activities = self.user_activity_tracker[user_id]['activities']
-        recent_activities = [a for a in activities if (datetime.now() - datetime.fromisoformat(a['timestamp'])).seconds < 300]  # Last 5 minutes
+        minutes = self.activity_window // 60
         
         # Check for rapid rule violations
-        rule_violations = [a for a in recent_activities if a['type'] == 'rule_violation']
-        if len(rule_violations) >= 3:
+        violations = tracked.count('rule_violation')
+        if violations >= 3:
             return {
                 'type': 'rapid_violations',
                 'severity': 'high',
-                'description': f'User has violated {len(rule_violations)} rules in the last 5 minutes',
-                'details': [v['details'] for v in rule_violations]
+                'description': f'User has violated {violations} rules in the last {minutes} minutes',
+                'details': [v.details for v in tracked.recent('rule_violation', self.activity_window)]
             }
         
         # Check for spam patterns
-        spam_activities = [a for a in recent_activities if a['type'] == 'spam']
-        if len(spam_activities) >= 5:
+        spam_count = tracked.count('spam')
+        if spam_count >= 5:
             return {
                 'type': 'spam_pattern',
                 'severity': 'medium',
-                'description': f'User has spammed {len(spam_activities)} times in the last 5 minutes',
-                'details': [s['details'] for s in spam_activities]
+                'description': f'User has spammed {spam_count} times in the last {minutes} minutes',
+                'details': [s.details for s in tracked.recent('spam', self.activity_window)]
             }
         
         return None
@@ -149,7 +165,7 @@ class ComprehensiveLogging(commands.Cog):
             thumbnail=user.display_avatar.url
         )
         
-        await self.send_log(guild, embed)
+        await self.send_log(guild, embed, lane=CRITICAL)
         self.track_user_activity(user.id, 'ban', f'Banned from server at {datetime.now()}')
     
     @commands.Cog.listener()
@@ -164,7 +180,7 @@ class ComprehensiveLogging(commands.Cog):
             thumbnail=user.display_avatar.url
         )
         
-        await self.send_log(guild, embed)
+        await self.send_log(guild, embed, lane=CRITICAL)
         self.track_user_activity(user.id, 'unban', f'Unbanned from server at {datetime.now()}')
     
     @commands.Cog.listener()
@@ -253,7 +269,10 @@ class ComprehensiveLogging(commands.Cog):
             inline=False
         )
         
-        await self.send_log(after.guild, embed)
+        await self.send_log(
+            after.guild, embed, lane=BULK, key=('edit', after.author.id),
+            summarize=self.summarize_bulk(after.author, 'edited messages', "Message Edits Summary")
+        )
         self.track_user_activity(after.author.id, 'message_edit', f'Edited message in {after.channel.name}')
     
     # Voice Events
@@ -274,7 +293,10 @@ class ComprehensiveLogging(commands.Cog):
             if after.channel:
                 embed.add_field(name="Joined", value=after.channel.mention, inline=True)
             
-            await self.send_log(member.guild, embed)
+            await self.send_log(
+                member.guild, embed, lane=BULK, key=('voice', member.id),
+                summarize=self.summarize_bulk(member, 'switched voice channels', "Voice Activity Summary")
+            )
             self.track_user_activity(member.id, 'voice_change', f'Changed voice channel at {datetime.now()}')
     
     # Command Events - Disabled command error logging
@@ -284,10 +306,10 @@ class ComprehensiveLogging(commands.Cog):
     #     pass  # Command errors are no longer logged
     
     # Integration with Rule Monitor
-    async def log_rule_violation(self, user, rule_num, rule_message, guild, original_message=None, channel=None):
+    async def log_rule_violation(self, user, rule_num, rule_message, guild, original_message=None, channel=None, edited=False):
         """Log rule violations from the rule monitor"""
         embed = self.create_log_embed(
-            "Rule Violation Detected",
+            "Rule Violation Detected (Edited Message)" if edited else "Rule Violation Detected",
             f"**User:** {user.mention} ({user.name}#{user.discriminator})\n"
             f"**User ID:** {user.id}\n"
             f"**Rule Broken:** #{rule_num}",
@@ -319,7 +341,7 @@ class ComprehensiveLogging(commands.Cog):
                 inline=True
             )
         
-        await self.send_log(guild, embed)
+        await self.send_log(guild, embed, lane=CRITICAL)
         self.track_user_activity(user.id, 'rule_violation', f'Violated Rule #{rule_num} in #{channel.name if channel else "unknown"}')
         
         # Check for suspicious activity
@@ -327,6 +349,15 @@ class ComprehensiveLogging(commands.Cog):
         if suspicious:
             await self.log_suspicious_activity(user, suspicious, guild)
     
+    async def log_spam_detected(self, user, kind, details, guild, channel=None):
+        """Record a rate-based spam detection from the rule monitor"""
+        self.track_user_activity(user.id, 'spam', f'{kind.title()} spam in #{channel.name if channel else "unknown"}: {details}')
+        
+        # Repeated spam escalates to a suspicious activity alert
+        suspicious = self.detect_suspicious_activity(user.id, guild.id)
+        if suspicious:
+            await self.log_suspicious_activity(user, suspicious, guild)
+    
     async def log_suspicious_activity(self, user, activity, guild):
         """Log suspicious user activity"""
         embed = self.create_log_embed(
@@ -346,7 +377,41 @@ class ComprehensiveLogging(commands.Cog):
                 inline=False
             )
         
-        await self.send_log(guild, embed)
+        await self.send_log(guild, embed, lane=CRITICAL)
+    
+    async def log_raid_wave(self, guild, wave):
+        """Log one aggregated alert for a payload posted by many users"""
+        users = sorted(wave['users'])
+        channels = sorted(wave['channels'])
+        
+        embed = self.create_log_embed(
+            "🌊 Raid Wave Detected",
+            f"**Messages:** {wave['messages']} in the last {wave['window']}s\n"
+            f"**Users:** {len(users)}\n"
+            f"**Channels:** {len(channels)}\n"
+            f"**Fingerprint:** `{wave['fingerprint']}`",
+            color=0xff0000
+        )
+        
+        embed.add_field(
+            name="💬 Payload",
+            value=f"```{wave['sample'][:1000]}```",
+            inline=False
+        )
+        embed.add_field(
+            name="👥 Users",
+            value=' '.join(f"<@{user_id}>" for user_id in users[:25]) + (f" and {len(users) - 25} more" if len(users) > 25 else ""),
+            inline=False
+        )
+        embed.add_field(
+            name="📍 Channels",
+            value=' '.join(f"<#{channel_id}>" for channel_id in channels[:25]),
+            inline=False
+        )
+        
+        await self.send_log(guild, embed, lane=CRITICAL)
+        for user_id in users:
+            self.track_user_activity(user_id, 'raid', f"Posted raid payload {wave['fingerprint']}")
     
     # Warning System Integration
     async def log_warning_issued(self, user, moderator, reason, warning_id, guild):
@@ -363,7 +428,7 @@ class ComprehensiveLogging(commands.Cog):
             thumbnail=user.display_avatar.url
         )
         
-        await self.send_log(guild, embed)
+        await self.send_log(guild, embed, lane=CRITICAL)
         self.track_user_activity(user.id, 'warning', f'Received warning #{warning_id} from {moderator.name}')
     
     async def log_warnings_cleared(self, user, moderator, warning_count, guild):
@@ -379,7 +444,7 @@ class ComprehensiveLogging(commands.Cog):
             thumbnail=user.display_avatar.url
         )
         
-        await self.send_log(guild, embed)
+        await self.send_log(guild, embed, lane=CRITICAL)
         self.track_user_activity(user.id, 'warnings_cleared', f'All {warning_count} warnings cleared by {moderator.name}')
     
     async def log_specific_warning_cleared(self, user, moderator, warning_data, guild):
@@ -401,7 +466,7 @@ class ComprehensiveLogging(commands.Cog):
             inline=False
         )
         
-        await self.send_log(guild, embed)
+        await self.send_log(guild, embed, lane=CRITICAL)
         self.track_user_activity(user.id, 'specific_warning_cleared', f'Warning #{warning_data["id"]} cleared by {moderator.name}')
     
     # Admin Commands
@@ -416,12 +481,13 @@ class ComprehensiveLogging(commands.Cog):
                 color=0x0099ff
             )
         else:
-            activities = self.user_activity_tracker[user.id]['activities'][-10:]  # Last 10 activities
+            tracked = self.user_activity_tracker[user.id]
+            activities = list(tracked.activities)[-10:]  # Last 10 activities
             
             embed = discord.Embed(
                 title=f"User Activity Report - {user.name}",
-                description=f"**Total Activities:** {len(self.user_activity_tracker[user.id]['activities'])}\n"
-                           f"**Last Activity:** <t:{int(self.user_activity_tracker[user.id]['last_activity'].timestamp())}:F>",
+                description=f"**Total Activities:** {len(tracked.activities)}\n"
+                           f"**Last Activity:** <t:{int(tracked.last_activity)}:F>",
                 color=0x0099ff,
                 thumbnail=user.display_avatar.url
             )
@@ -429,8 +495,7 @@ class ComprehensiveLogging(commands.Cog):
             if activities:
                 activity_text = ""
                 for activity in activities:
-                    timestamp = datetime.fromisoformat(activity['timestamp'])
-                    activity_text += f"**<t:{int(timestamp.timestamp())}:R>** - {activity['type']}: {activity['details']}\n"
+                    activity_text += f"**<t:{int(activity.wall)}:R>** - {activity.type}: {activity.details}\n"
                 
                 embed.add_field(
                     name="Recent Activities",
@@ -461,6 +526,17 @@ class ComprehensiveLogging(commands.Cog):
         else:
             embed.description = f"❌ Log channel not found!\n**Expected ID:** {self.log_channel_id}"
         
+        dispatcher = self.dispatcher
+        embed.add_field(
+            name="Delivery",
+            value=f"{dispatcher.sent} logs in {dispatcher.messages} messages\n"
+                  f"API calls saved: {dispatcher.calls_saved} ({dispatcher.calls_saved_per_minute():.1f}/min)\n"
+                  f"Pending: {dispatcher.pending} • Failed: {dispatcher.failed}\n"
+                  f"By lane: {' • '.join(f'{name} {sent}' for name, sent in zip(LANE_NAMES, dispatcher.sent_by_lane))}\n"
+                  f"Summaries: {dispatcher.summaries} ({dispatcher.coalesced} events)",
+            inline=True
+        )
+        
         await ctx.reply(embed=embed)
 
 async def setup(bot):
@@ -4,10 +4,14 @@ import traceback
 import io
 import contextlib
 
+import logging
+
 import discord
 from discord.ext import commands
 import import_expression
 
+from utils.logs import ROOT_LOGGER, get_logger, registered_loggers, set_level
+
 class Owner(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -124,6 +128,111 @@ class Owner(commands.Cog):
         await ctx.invoke(
             ctx, *extensions
         )
+
+    @commands.group(name='blacklist', aliases=['bl'], invoke_without_command=True)
+    async def blacklist(self, ctx: commands.Context):
+        """Manage the bot blacklist."""
+        await ctx.send_help(ctx.command)
+
+    @blacklist.command(name='add')
+    async def blacklist_add(self, ctx: commands.Context, user: discord.User):
+        """Blacklists a user from the bot."""
+        if self.bot.blacklist.add(user.id):
+            await ctx.reply(f'{user} (`{user.id}`) has been blacklisted.')
+        else:
+            await ctx.reply(f'{user} (`{user.id}`) is already blacklisted.')
+
+    @blacklist.command(name='remove', aliases=['rm'])
+    async def blacklist_remove(self, ctx: commands.Context, user: discord.User):
+        """Removes a user from the blacklist."""
+        if self.bot.blacklist.remove(user.id):
+            await ctx.reply(f'{user} (`{user.id}`) has been removed from the blacklist.')
+        else:
+            await ctx.reply(f'{user} (`{user.id}`) is not blacklisted.')
+
+    @blacklist.command(name='list')
+    async def blacklist_list(self, ctx: commands.Context):
+        """Lists all blacklisted users."""
+        users = sorted(self.bot.blacklist.users)
+        if not users:
+            return await ctx.reply('Nobody is blacklisted.')
+
+        lines = '\n'.join(f'<@{user_id}> (`{user_id}`)' for user_id in users[:50])
+        if len(users) > 50:
+            lines += f'\n... and {len(users) - 50} more'
+
+        embed = discord.Embed(
+            title=f'Blacklisted Users ({len(users)})',
+            description=lines[:4096]
+        )
+        await ctx.reply(embed=embed)
+
+    @commands.group(name='logs', invoke_without_command=True)
+    async def logs(self, ctx: commands.Context):
+        """Shows the log level and sample rate of each cog logger."""
+        root = logging.getLogger(ROOT_LOGGER)
+        lines = [f'`{ROOT_LOGGER}`: {logging.getLevelName(root.getEffectiveLevel())}']
+        for name, logger in sorted(logging.Logger.manager.loggerDict.items()):
+            if name.startswith(ROOT_LOGGER + '.') and isinstance(logger, logging.Logger):
+                short_name = name[len(ROOT_LOGGER) + 1:]
+                lines.append(
+                    f'`{short_name}`: {logging.getLevelName(logger.getEffectiveLevel())}, '
+                    f'sampling {get_logger(short_name).sample_rate:.2%} of per-message events'
+                )
+
+        embed = discord.Embed(title='Loggers', description='\n'.join(lines)[:4096])
+        await ctx.reply(embed=embed)
+
+    def _unknown_logger(self, name: str) -> str:
+        names = ', '.join(f'`{logger}`' for logger in registered_loggers())
+        return f'Unknown logger `{name}`, the loggers are: {names}.'
+
+    @logs.command(name='level')
+    async def logs_level(self, ctx: commands.Context, name: str, level: str):
+        """Sets the level of a cog logger, use `all` for every logger."""
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            return await ctx.reply(f'Unknown log level `{level}`.')
+        if name != 'all' and name not in registered_loggers():
+            return await ctx.reply(self._unknown_logger(name))
+
+        set_level(None if name == 'all' else name, level)
+        await ctx.reply(f'Log level for `{name}` set to {level}.')
+
+    @logs.command(name='sample')
+    async def logs_sample(self, ctx: commands.Context, name: str, rate: float):
+        """Sets the fraction of per-message debug events a cog logger keeps."""
+        if not 0 <= rate <= 1:
+            return await ctx.reply('The sample rate must be between 0 and 1.')
+        if name not in registered_loggers():
+            return await ctx.reply(self._unknown_logger(name))
+
+        get_logger(name).sample_rate = rate
+        await ctx.reply(f'`{name}` now samples {rate:.2%} of per-message events.')
+
+    @commands.group(name='pipeline', invoke_without_command=True)
+    async def pipeline(self, ctx: commands.Context):
+        """Shows the message pipeline stages and their timings."""
+        embed = discord.Embed(title='Message Pipeline')
+        for stage in self.bot.pipeline.stages:
+            embed.add_field(
+                name=f'{stage.priority} · {stage.name}',
+                value=(
+                    f'Ran {stage.calls}, skipped {stage.skipped}, consumed {stage.stopped}, errors {stage.errors}\n'
+                    f'Avg {stage.average_ms:.3f} ms, max {stage.max_ns / 1e6:.3f} ms'
+                ),
+                inline=False
+            )
+
+        if not embed.fields:
+            embed.description = 'No stages registered.'
+        await ctx.reply(embed=embed)
+
+    @pipeline.command(name='reset')
+    async def pipeline_reset(self, ctx: commands.Context):
+        """Resets the pipeline stage counters."""
+        self.bot.pipeline.reset_stats()
+        await ctx.reply('Pipeline counters reset.')
     
 async def setup(bot):
     await bot.add_cog(Owner(bot))
\ No newline at end of file
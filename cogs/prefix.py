@@ -0,0 +1,51 @@
+import discord
+from discord.ext import commands
+
+class Prefix(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+    
+    @commands.command(name='setprefix')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def set_prefix(self, ctx: commands.Context, prefix: str) -> None:
+        """Set a custom prefix for this server"""
+        if len(prefix) > 5:
+            embed = discord.Embed(
+                title="❌ Prefix Too Long",
+                description="Prefixes can be at most **5** characters long.",
+                color=0xff0000
+            )
+            await ctx.reply(embed=embed, delete_after=10)
+            return
+        
+        self.bot.prefixes.set(ctx.guild.id, prefix)
+        
+        embed = discord.Embed(
+            title="✅ Prefix Updated",
+            description=f"The prefix for this server is now `{prefix}`",
+            color=0x00ff00
+        )
+        await ctx.reply(embed=embed)
+    
+    @commands.command(name='resetprefix')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def reset_prefix(self, ctx: commands.Context) -> None:
+        """Reset this server's prefix to the default"""
+        if self.bot.prefixes.reset(ctx.guild.id):
+            embed = discord.Embed(
+                title="✅ Prefix Reset",
+                description=f"The prefix for this server is back to `{self.bot.prefixes.default}`",
+                color=0x00ff00
+            )
+        else:
+            embed = discord.Embed(
+                title="ℹ️ Nothing To Reset",
+                description=f"This server is already using the default prefix `{self.bot.prefixes.default}`",
+                color=0x0099ff
+            )
+        await ctx.reply(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(Prefix(bot))
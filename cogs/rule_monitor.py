@@ -1,14 +1,32 @@
 import discord
 from discord.ext import commands
-import re
 import asyncio
-from datetime import datetime, timedelta
+import os
+import re
+from collections import Counter
+from typing import Union
+from utils.exemptions import ExemptionIndex
+from utils.expiring_map import ExpiringMap
+from utils.logs import get_logger
+from utils.pipeline import MessageContext
+from utils.raid_detector import RaidDetector, fingerprint
+from utils.regex_worker import RegexWorker
+from utils.rulesets import RulesetCache
+from utils.scan_queue import ScanQueue
+from utils.spam_detector import SpamDetector, SpamThresholds
+from utils.text_diff import edit_window
+from utils.text_fold import fold
 
 class RuleMonitor(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.cooldown_users = {}  # Track users to avoid spam
+        self.log = get_logger('rule_monitor')
         self.cooldown_duration = 300  # 5 minutes cooldown per user
+        # Track users to avoid spam, bounded so memory stays flat on busy guilds
+        self.cooldown_users = ExpiringMap(
+            ttl=self.cooldown_duration,
+            maxsize=int(os.getenv('RULE_COOLDOWN_MAX_USERS', '10000'))
+        )
         
         # Define rule patterns and their corresponding rule numbers with police persona
         self.rule_patterns = {
@@ -38,7 +56,7 @@ class RuleMonitor(commands.Cog):
             3: {
                 'patterns': [
                     r'\b(rob|robbing|heist|heisting|steal|stealing)\b',
-                    r'\b(take.*money|steal.*money|rob.*money)\b',
+                    r'\b(take|steal|rob).*money\b',
                     r'\b(mafia|mafiabot|robbery)\b'
                 ],
                 'message': "🚨 **STOP RIGHT THERE!** Robbing is illegal in this jurisdiction! You've broken **Rule #3**!"
@@ -144,88 +162,363 @@ class RuleMonitor(commands.Cog):
                 'message': "🚨 **CRIMINAL BEHAVIOR!** You're exploiting the system! That violates **Rule #12** - use your common sense!"
             }
         }
+        
+        # Each guild's rules are compiled once per config version instead of
+        # searched pattern by pattern. Moderator-supplied regexes only run in
+        # the worker, under a time budget
+        self.regex_worker = RegexWorker(budget=int(os.getenv('RULE_REGEX_BUDGET_MS', '50')) / 1000)
+        self.rulesets = RulesetCache(self.rule_patterns, worker=self.regex_worker, on_quarantine=self.quarantine_pattern)
+    
+        # Rate-based spam checks run alongside the content patterns
+        self.spam_detector = SpamDetector(maxsize=int(os.getenv('SPAM_TRACK_MAX_USERS', '50000')))
+        
+        # Raid waves: the same payload from many users across channels
+        self.raid_detector = RaidDetector(
+            threshold=int(os.getenv('RAID_USER_THRESHOLD', '5')),
+            window=int(os.getenv('RAID_WINDOW_SECONDS', '60')),
+            min_length=int(os.getenv('RAID_MIN_LENGTH', '12')),
+            near_duplicates=os.getenv('RAID_SIMHASH', '0') == '1'
+        )
+        # Identical payloads reuse the verdict instead of being scanned again
+        self.verdicts = ExpiringMap(ttl=int(os.getenv('RULE_VERDICT_TTL_SECONDS', '30')), maxsize=5000)
+        
+        # Staff, ticket channels and configured exemptions skip monitoring entirely
+        self.exemptions = ExemptionIndex(
+            channel_prefixes=[prefix for prefix in os.getenv('RULE_EXEMPT_CHANNEL_PREFIXES', 'ticket-').split(',') if prefix],
+            exempt_staff=os.getenv('RULE_EXEMPT_STAFF', '1') == '1'
+        )
+        self.stats = Counter()
+        # Edits are scanned over the changed text plus this many characters each side
+        self.edit_margin = int(os.getenv('RULE_EDIT_MARGIN', '64'))
+        # Verdicts being acted on outside the pipeline, so replies never hold up commands
+        self.verdict_tasks = set()
+        
+        # New messages are scanned in micro-batches on a thread, off the event loop
+        self.scan_queue = None
+        if os.getenv('RULE_SCAN_MODE', 'batched') == 'batched':
+            self.scan_queue = ScanQueue(
+                self.scan_message,
+                self.finish_scan,
+                batch_size=int(os.getenv('RULE_SCAN_BATCH_SIZE', '32')),
+                linger=int(os.getenv('RULE_SCAN_LINGER_MS', '5')) / 1000,
+                maxsize=int(os.getenv('RULE_SCAN_QUEUE_SIZE', '1000')),
+                threads=int(os.getenv('RULE_SCAN_THREADS', '1'))
+            )
+    
+    async def cog_load(self):
+        for guild_id, values in (await self.bot.storage.all_spam_thresholds()).items():
+            self.spam_detector.guild_thresholds[guild_id] = SpamThresholds(**values)
+        for guild_id, config in (await self.bot.storage.all_rule_configs()).items():
+            await self.rulesets.update(guild_id, config)
+        
+        for guild in self.bot.guilds:
+            self.index_exemptions(guild)
+        
+        pipeline = self.bot.pipeline
+        pipeline.provide('spam_thresholds', self.spam_detector.thresholds_for, owner=self)
+        pipeline.provide('rules', self.rulesets.get, owner=self)
+        pipeline.register('rule_monitor', self.handle_message, priority=50, predicate=lambda ctx: not ctx.is_bot, owner=self)
+        
+        if self.scan_queue is not None:
+            self.scan_queue.start()
+    
+    async def cog_unload(self):
+        self.bot.pipeline.unregister_owner(self)
+        if self.scan_queue is not None:
+            await self.scan_queue.close()
+        if self.verdict_tasks:
+            await asyncio.gather(*self.verdict_tasks, return_exceptions=True)
+        await self.regex_worker.close()
     
     def is_user_on_cooldown(self, user_id):
         """Check if user is on cooldown for rule reminders"""
-        if user_id in self.cooldown_users:
-            if datetime.now() - self.cooldown_users[user_id] < timedelta(seconds=self.cooldown_duration):
-                return True
-            else:
-                del self.cooldown_users[user_id]
-        return False
+        return user_id in self.cooldown_users
     
     def add_user_cooldown(self, user_id):
         """Add user to cooldown"""
-        self.cooldown_users[user_id] = datetime.now()
+        self.cooldown_users[user_id] = True
     
-    def check_message_for_rules(self, message_content):
-        """Check message content against all rule patterns"""
-        message_lower = message_content.lower()
-        
-        for rule_num, rule_data in self.rule_patterns.items():
-            for pattern in rule_data['patterns']:
-                if re.search(pattern, message_lower, re.IGNORECASE):
-                    return rule_num, rule_data['message']
-        
-        return None, None
+    async def refresh_rules(self, guild_id):
+        """Reload a guild's rule config and rebuild its ruleset if the version moved"""
+        config = await self.bot.storage.get_rule_config(guild_id)
+        ruleset = await self.rulesets.update(guild_id, config)
+        guild = self.bot.get_guild(guild_id)
+        if guild is not None:
+            self.index_exemptions(guild)
+        return ruleset
+    
+    def index_exemptions(self, guild):
+        """Rebuild a guild's exemption index from its rule config, channels and roles"""
+        self.exemptions.build(guild, self.rulesets.get(guild.id))
+    
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        self.index_exemptions(guild)
+    
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self.index_exemptions(guild)
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.exemptions.discard(guild.id)
+    
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.index_exemptions(role.guild)
     
     @commands.Cog.listener()
-    async def on_message(self, message):
-        """Monitor all messages for rule violations"""
-        # Debug: Print message content for testing
-        print(f"Rule Monitor: Received message '{message.content}' from {message.author.name}")
-        
-        # Ignore bot messages
-        if message.author.bot:
-            print(f"Rule Monitor: Ignoring bot message from {message.author.name}")
+    async def on_guild_role_update(self, before, after):
+        # Only permission changes can move a role in or out of staff
+        if before.permissions != after.permissions:
+            self.index_exemptions(after.guild)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        self.index_exemptions(channel.guild)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        # Renames and moves between categories change which channels are exempt
+        if before.name != after.name or getattr(before, 'category_id', None) != getattr(after, 'category_id', None):
+            self.index_exemptions(after.guild)
+    
+    async def quarantine_pattern(self, guild_id, rule_num, pattern):
+        """Stop running a custom regex that overran the worker's time budget"""
+        self.log.warning('regex quarantined', guild_id=guild_id, rule=rule_num, timeouts=self.regex_worker.timeouts)
+        if await self.bot.storage.quarantine_rule_pattern(guild_id, pattern) is not None:
+            await self.refresh_rules(guild_id)
+    
+    def verdict_key(self, ruleset, lowered):
+        # The matcher lowercases first, so equal lowercased text means an equal verdict
+        return (*ruleset.cache_key, fingerprint(lowered))
+    
+    def scan_message(self, item):
+        """Find the first built-in rule hit for a queued (message, ruleset, key), runs on the scan thread"""
+        message, ruleset, _ = item
+        return ruleset.matcher.locate(message.content)
+    
+    async def finish_scan(self, item, result):
+        """Back on the loop: run custom regexes, cache the verdict and act on it"""
+        message, ruleset, key = item
+        verdict = await ruleset.matcher.resolve(*result)
+        self.verdicts[key] = verdict
+        # Near saturation, violations are still logged but reminders wait
+        await self.handle_verdict(message, *verdict, log_only=self.scan_queue.saturated)
+    
+    async def check_message_for_rules(self, message_content, lowered=None, ruleset=None, folded=None, start=None):
+        """Check message content against all rule patterns, or those from rule `start` on"""
+        ruleset = ruleset or self.rulesets.default
+        lowered = lowered if lowered is not None else message_content.lower()
+        key = self.verdict_key(ruleset, lowered)
+        if start is not None:
+            key = (*key, start)
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            verdict = await ruleset.matcher.scan(message_content, folded, start)
+            self.verdicts[key] = verdict
+        else:
+            self.stats['cached'] += 1
+        return verdict
+    
+    async def check_message_rate(self, ctx):
+        """Feed a message to the spam detector and report anything it flags"""
+        message = ctx.message
+        mentions = len(message.mentions) + len(message.role_mentions) + (1 if message.mention_everyone else 0)
+        flags = self.spam_detector.check(
+            ctx.guild_id, message.channel.id, ctx.author_id, ctx.content, mentions,
+            limits=ctx.config('spam_thresholds')
+        )
+        if not flags:
+            return
+        
+        logging_cog = self.bot.get_cog('ComprehensiveLogging')
+        for kind, details in flags:
+            self.log.info('spam detected', kind=kind, author_id=message.author.id, channel_id=message.channel.id)
+            if logging_cog:
+                await logging_cog.log_spam_detected(message.author, kind, details, message.guild, message.channel)
+    
+    async def check_raid_wave(self, ctx):
+        """Count the message towards raid waves and report one that crosses the threshold"""
+        message = ctx.message
+        wave = self.raid_detector.observe(ctx.guild_id, message.channel.id, ctx.author_id, ctx.content, ctx.normalized)
+        if wave is None:
             return
         
+        self.log.warning('raid wave detected', guild_id=message.guild.id, fingerprint=wave['fingerprint'], users=len(wave['users']))
+        logging_cog = self.bot.get_cog('ComprehensiveLogging')
+        if logging_cog:
+            await logging_cog.log_raid_wave(message.guild, wave)
+    
+    async def handle_message(self, ctx):
+        """Monitor all messages for rule violations (pipeline stage, bots are filtered out)"""
+        message = ctx.message
+        
         # Ignore messages from bot owners (disabled for testing)
         # if await self.bot.is_owner(message.author):
         #     print(f"Rule Monitor: Ignoring owner message from {message.author.name}")
         #     return
         
-        # Check message for rule violations first
-        rule_num, rule_message = self.check_message_for_rules(message.content)
-        print(f"Rule Monitor: Checked message, rule_num: {rule_num}, message: {rule_message}")
+        # Exempt channels and roles are rejected before any text is looked at
+        if not ctx.is_dm and self.exemptions.check(
+            ctx.guild_id, message.channel.id, getattr(message.channel, 'parent_id', None), ctx.role_ids
+        ):
+            return
         
-        if rule_num and rule_message:
-            print(f"Rule Monitor: Rule violation detected! Rule #{rule_num}")
-            
-            # Always log the rule violation (regardless of cooldown)
-            logging_cog = self.bot.get_cog('ComprehensiveLogging')
-            if logging_cog:
-                await logging_cog.log_rule_violation(message.author, rule_num, rule_message, message.guild, message.content, message.channel)
-            
-            # Check if user is on cooldown for sending reminders
-            if self.is_user_on_cooldown(message.author.id):
-                print(f"Rule Monitor: User {message.author.name} is on cooldown - logged but no reminder sent")
+        self.stats['checked'] += 1
+        if not ctx.is_dm:
+            await self.check_message_rate(ctx)
+            await self.check_raid_wave(ctx)
+        
+        # Moderators' own commands (rule dry runs, keyword edits) are not violations
+        if ctx.is_command and isinstance(message.author, discord.Member) and message.author.guild_permissions.manage_messages:
+            return
+        
+        ruleset = ctx.config('rules')
+        if self.scan_queue is None:
+            verdict = await self.check_message_for_rules(ctx.content, ctx.lowered, ruleset, ctx.folded)
+        else:
+            key = self.verdict_key(ruleset, ctx.lowered)
+            verdict = self.verdicts.get(key)
+            if verdict is None:
+                if not self.scan_queue.submit((message, ruleset, key)) and self.scan_queue.dropped % 100 == 1:
+                    self.log.warning('scan queue full, dropping messages', dropped=self.scan_queue.dropped, depth=self.scan_queue.depth)
                 return
-            
-            # Add user to cooldown
-            self.add_user_cooldown(message.author.id)
-            
-            # Create rule reminder embed with police persona
-            embed = discord.Embed(
-                title="🚨 POLICE ALERT",
-                description=f"{message.author.mention}, {rule_message}",
-                color=0xff0000
+            self.stats['cached'] += 1
+        
+        if not verdict[0]:
+            await self.handle_verdict(message, *verdict)
+            return
+        
+        # The stage runs before commands, so the log and reminder are sent in their own task
+        task = asyncio.create_task(self.handle_verdict(message, *verdict))
+        self.verdict_tasks.add(task)
+        task.add_done_callback(self.finish_verdict_task)
+    
+    def finish_verdict_task(self, task):
+        self.verdict_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error('verdict handling failed', error=repr(task.exception()))
+    
+    async def handle_verdict(self, message, rule_num, rule_message, log_only=False):
+        """Act on the scan result for a new message"""
+        # Per-message tracing is sampled, and never includes the content itself
+        if self.log.sampled():
+            self.log.debug(
+                'message checked',
+                message_id=message.id,
+                author_id=message.author.id,
+                channel_id=message.channel.id,
+                length=len(message.content),
+                rule=rule_num
             )
-            embed.set_footer(text="This is your warning! Next violation may result in disciplinary action!")
-            
-            # Send the reminder
+        
+        if rule_num and rule_message:
+            await self.report_violation(message, rule_num, rule_message, log_only=log_only)
+    
+    async def report_violation(self, message, rule_num, rule_message, edited=False, log_only=False):
+        """Log a rule violation and remind the author, unless they were reminded recently or `log_only` is set"""
+        self.stats['violations'] += 1
+        self.log.info(
+            'rule violation',
+            rule=rule_num,
+            message_id=message.id,
+            author_id=message.author.id,
+            channel_id=message.channel.id,
+            edited=edited
+        )
+        
+        # Always log the rule violation (regardless of cooldown)
+        logging_cog = self.bot.get_cog('ComprehensiveLogging')
+        if logging_cog:
+            await logging_cog.log_rule_violation(message.author, rule_num, rule_message, message.guild, message.content, message.channel, edited=edited)
+        
+        if log_only:
+            self.stats['log_only'] += 1
+            return
+        
+        # Check if user is on cooldown for sending reminders
+        if self.is_user_on_cooldown(message.author.id):
+            self.log.debug('reminder suppressed by cooldown', rule=rule_num, author_id=message.author.id)
+            return
+        
+        # Add user to cooldown
+        self.add_user_cooldown(message.author.id)
+        self.stats['reminders'] += 1
+        
+        # Create rule reminder embed with police persona
+        embed = discord.Embed(
+            title="🚨 POLICE ALERT",
+            description=f"{message.author.mention}, {rule_message}",
+            color=0xff0000
+        )
+        embed.set_footer(text="This is your warning! Next violation may result in disciplinary action!")
+        
+        # Send the reminder
+        try:
+            await message.reply(embed=embed, delete_after=30)
+            self.log.debug('reminder sent', rule=rule_num, message_id=message.id)
+        except discord.Forbidden:
+            # If we can't reply, try sending to the channel
             try:
-                await message.reply(embed=embed, delete_after=30)
-                print(f"Rule Monitor: Sent rule reminder for Rule #{rule_num}")
-            except discord.Forbidden:
-                # If we can't reply, try sending to the channel
-                try:
-                    await message.channel.send(embed=embed, delete_after=30)
-                    print(f"Rule Monitor: Sent rule reminder to channel for Rule #{rule_num}")
-                except Exception as e:
-                    print(f"Rule Monitor: Failed to send reminder: {e}")
+                await message.channel.send(embed=embed, delete_after=30)
+                self.log.debug('reminder sent to channel', rule=rule_num, channel_id=message.channel.id)
+            except Exception as e:
+                self.log.warning('reminder failed', rule=rule_num, channel_id=message.channel.id, error=str(e))
+    
+    async def check_edit(self, before_content, message):
+        """Scan what an edit changed, with the same logging and cooldown as new messages
+
+        Only the changed text plus a margin is scanned. The first rule the
+        new window breaks that the same window before the edit did not
+        already break is reported. Without the old content (uncached
+        messages) the whole message is scanned.
+        """
+        if message.author.bot or message.content == before_content:
+            return
+        
+        ctx = MessageContext(self.bot.pipeline, message)
+        if not ctx.is_dm and self.exemptions.check(
+            ctx.guild_id, message.channel.id, getattr(message.channel, 'parent_id', None), ctx.role_ids
+        ):
+            return
+        if ctx.is_command and isinstance(message.author, discord.Member) and message.author.guild_permissions.manage_messages:
+            return
+        
+        self.stats['edits'] += 1
+        ruleset = ctx.config('rules')
+        if before_content is None:
+            rule_num, rule_message = await self.check_message_for_rules(ctx.content, ctx.lowered, ruleset, ctx.folded)
         else:
-            print(f"Rule Monitor: No rule violation detected in message")
+            old_window, new_window = edit_window(before_content, ctx.content, self.edit_margin)
+            self.stats['edit_chars'] += len(new_window)
+            start = None
+            while True:
+                rule_num, rule_message = await self.check_message_for_rules(new_window, ruleset=ruleset, start=start)
+                if not rule_num:
+                    return
+                # Earlier rules are not in the new window, so the old one is only checked from this rule on
+                old_rule, _ = await self.check_message_for_rules(old_window, ruleset=ruleset, start=rule_num)
+                if old_rule != rule_num:
+                    break
+                start = ruleset.matcher.rule_after(rule_num)
+                if start is None:
+                    return
+        
+        if rule_num and rule_message:
+            await self.report_violation(message, rule_num, rule_message, edited=True)
+    
+    @commands.Cog.listener()
+    async def on_message_edit(self, before, after):
+        await self.check_edit(before.content, after)
+    
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        # Cached messages are handled by on_message_edit, with their old content.
+        # Embed-only updates (link previews) carry no content
+        if payload.cached_message is not None or 'content' not in payload.data:
+            return
+        await self.check_edit(None, payload.message)
     
     @commands.command(name='rulecooldown')
     @commands.has_permissions(manage_messages=True)
@@ -235,9 +528,10 @@ class RuleMonitor(commands.Cog):
             user = ctx.author
         
         if self.is_user_on_cooldown(user.id):
+            remaining = int(self.cooldown_users.remaining(user.id))
             embed = discord.Embed(
                 title="⏰ Rule Cooldown Active",
-                description=f"{user.mention} is currently on cooldown for rule reminders.",
+                description=f"{user.mention} is currently on cooldown for rule reminders ({remaining // 60}m {remaining % 60}s left).",
                 color=0xff9900
             )
         else:
@@ -247,14 +541,23 @@ class RuleMonitor(commands.Cog):
                 color=0x00ff00
             )
         
+        cooldowns = self.cooldown_users
+        cooldowns.purge()
+        embed.add_field(
+            name="Cooldown Tracker",
+            value=f"Tracked: {len(cooldowns)}/{cooldowns.maxsize}\n"
+                  f"Expired: {cooldowns.expired}\n"
+                  f"Evicted at cap: {cooldowns.evicted}",
+            inline=False
+        )
+        
         await ctx.reply(embed=embed, delete_after=10)
     
     @commands.command(name='clearrulecooldown')
     @commands.has_permissions(manage_messages=True)
     async def clear_rule_cooldown(self, ctx, user: discord.Member):
         """Clear rule reminder cooldown for a user"""
-        if user.id in self.cooldown_users:
-            del self.cooldown_users[user.id]
+        if self.cooldown_users.pop(user.id) is not None:
             embed = discord.Embed(
                 title="✅ Cooldown Cleared",
                 description=f"Rule reminder cooldown cleared for {user.mention}",
@@ -292,6 +595,381 @@ class RuleMonitor(commands.Cog):
         
         embed.set_footer(text="Use -rulecooldown to check user cooldowns")
         await ctx.reply(embed=embed)
+    
+    @commands.command(name='rulestats')
+    @commands.has_permissions(manage_messages=True)
+    async def show_rule_stats(self, ctx):
+        """Show rule monitoring counters since the bot started"""
+        stats = self.stats
+        embed = discord.Embed(
+            title="📊 Rule Monitoring Stats",
+            color=0x0099ff
+        )
+        embed.add_field(
+            name="Messages",
+            value=f"Checked: {stats['checked']}\n"
+                  f"Edits checked: {stats['edits']} (avg window {stats['edit_chars'] // max(stats['edits'], 1)} chars)\n"
+                  f"Exempt: {self.exemptions.hits}\n"
+                  f"Verdicts from cache: {stats['cached']}",
+            inline=True
+        )
+        embed.add_field(
+            name="Violations",
+            value=f"Detected: {stats['violations']}\n"
+                  f"Reminders sent: {stats['reminders']}",
+            inline=True
+        )
+        embed.add_field(
+            name="Rulesets",
+            value=f"Custom: {len(self.rulesets)}\n"
+                  f"Compiled: {self.rulesets.builds}\n"
+                  f"Exemption indexes: {len(self.exemptions)}",
+            inline=True
+        )
+        
+        queue = self.scan_queue
+        if queue is not None:
+            embed.add_field(
+                name="Scan Queue",
+                value=f"Depth: {queue.depth}/{queue.maxsize} (peak {queue.max_depth})\n"
+                      f"Batches: {queue.batches} (avg {queue.scanned / max(queue.batches, 1):.1f} messages)\n"
+                      f"Latency: p50 {queue.latency_percentile(50) * 1000:.1f}ms, "
+                      f"p99 {queue.latency_percentile(99) * 1000:.1f}ms, max {queue.max_latency * 1000:.1f}ms\n"
+                      f"Dropped: {queue.dropped} • Failed: {queue.failed} • Log-only: {stats['log_only']}",
+                inline=False
+            )
+        else:
+            embed.add_field(name="Scan Queue", value="Off, messages are scanned inline", inline=False)
+        await ctx.reply(embed=embed)
+    
+    @commands.group(name='rulekeyword', aliases=['rulekw'], invoke_without_command=True)
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_keyword(self, ctx):
+        """Manage the keywords flagged by rule monitoring in this server"""
+        await ctx.send_help(ctx.command)
+    
+    @rule_keyword.command(name='add')
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_keyword_add(self, ctx, rule_num: int, *, keyword: str):
+        """Flag a keyword under a rule"""
+        if rule_num not in self.rule_patterns:
+            await ctx.reply(f"❌ There is no Rule #{rule_num}.", delete_after=10)
+            return
+        
+        keyword = keyword.lower()
+        ruleset = self.rulesets.get(ctx.guild.id)
+        owner = ruleset.matcher.keyword_rule(fold(keyword))
+        if owner == rule_num:
+            embed = discord.Embed(
+                title="ℹ️ Keyword Already Flagged",
+                description=f"`{keyword}` is already flagged under **Rule #{rule_num}**.",
+                color=0x0099ff
+            )
+        else:
+            # An explicit assignment takes the keyword over from the rule that had it
+            await self.bot.storage.set_rule_keyword(ctx.guild.id, rule_num, keyword)
+            await self.refresh_rules(ctx.guild.id)
+            moved = f" instead of Rule #{owner}" if owner is not None else ""
+            embed = discord.Embed(
+                title="✅ Keyword Added",
+                description=f"`{keyword}` is now flagged under **Rule #{rule_num}**{moved}.",
+                color=0x00ff00
+            )
+        
+        await ctx.reply(embed=embed, delete_after=10)
+    
+    @rule_keyword.command(name='remove', aliases=['rm'])
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_keyword_remove(self, ctx, *, keyword: str):
+        """Stop flagging a keyword, built-in or added with -rulekeyword add"""
+        keyword = keyword.lower()
+        builtin = self.rulesets.default.matcher.keyword_rule(fold(keyword)) is not None
+        if await self.bot.storage.remove_rule_keyword(ctx.guild.id, keyword, builtin) is not None:
+            await self.refresh_rules(ctx.guild.id)
+            embed = discord.Embed(
+                title="✅ Keyword Removed",
+                description=f"`{keyword}` is no longer flagged.",
+                color=0x00ff00
+            )
+        else:
+            embed = discord.Embed(
+                title="ℹ️ Keyword Not Found",
+                description=f"`{keyword}` is not a flagged keyword.",
+                color=0x0099ff
+            )
+        
+        await ctx.reply(embed=embed, delete_after=10)
+    
+    @rule_keyword.command(name='list')
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_keyword_list(self, ctx, rule_num: int):
+        """List the keywords flagged under a rule"""
+        if rule_num not in self.rule_patterns:
+            await ctx.reply(f"❌ There is no Rule #{rule_num}.", delete_after=10)
+            return
+        
+        ruleset = self.rulesets.get(ctx.guild.id)
+        if rule_num in ruleset.disabled:
+            await ctx.reply(f"ℹ️ Rule #{rule_num} is disabled in this server.", delete_after=10)
+            return
+        
+        keywords = ruleset.matcher.keywords_for(rule_num)
+        embed = discord.Embed(
+            title=f"🔍 Rule #{rule_num} Keywords ({len(keywords)})",
+            description=", ".join(f"`{keyword}`" for keyword in keywords)[:4096] or "No keywords flagged.",
+            color=0x0099ff
+        )
+        embed.set_footer(text=f"{len(ruleset.keywords.get(rule_num, ()))} added for this server • "
+                              f"{len(ruleset.removed_keywords)} built-in keywords removed")
+        await ctx.reply(embed=embed)
+    
+    @commands.group(name='ruleregex', invoke_without_command=True)
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_regex(self, ctx):
+        """Manage custom regexes for rule monitoring in this server"""
+        await ctx.send_help(ctx.command)
+    
+    @rule_regex.command(name='add')
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_regex_add(self, ctx, rule_num: int, *, pattern: str):
+        """Flag a custom regex under a rule, matched against the lowercased message as typed"""
+        if rule_num not in self.rule_patterns:
+            await ctx.reply(f"❌ There is no Rule #{rule_num}.", delete_after=10)
+            return
+        
+        try:
+            re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            await ctx.reply(f"❌ Invalid regex: {e}", delete_after=10)
+            return
+        
+        await self.bot.storage.add_rule_pattern(ctx.guild.id, 'regex', rule_num, pattern)
+        await self.refresh_rules(ctx.guild.id)
+        embed = discord.Embed(
+            title="✅ Regex Added",
+            description=f"`{pattern}` is now flagged under **Rule #{rule_num}**.",
+            color=0x00ff00
+        )
+        embed.set_footer(text=f"Custom regexes get {self.regex_worker.budget * 1000:.0f}ms per message before they are quarantined")
+        await ctx.reply(embed=embed, delete_after=10)
+    
+    @rule_regex.command(name='remove', aliases=['rm'])
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_regex_remove(self, ctx, *, pattern: str):
+        """Stop flagging a custom regex"""
+        if await self.bot.storage.remove_rule_pattern(ctx.guild.id, 'regex', pattern) is not None:
+            await self.refresh_rules(ctx.guild.id)
+            embed = discord.Embed(
+                title="✅ Regex Removed",
+                description=f"`{pattern}` is no longer flagged.",
+                color=0x00ff00
+            )
+        else:
+            embed = discord.Embed(
+                title="ℹ️ Regex Not Found",
+                description=f"`{pattern}` is not a custom regex.",
+                color=0x0099ff
+            )
+        
+        await ctx.reply(embed=embed, delete_after=10)
+    
+    @rule_regex.command(name='list')
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def rule_regex_list(self, ctx):
+        """List custom regexes and any that were quarantined"""
+        ruleset = self.rulesets.get(ctx.guild.id)
+        embed = discord.Embed(
+            title="🔍 Custom Rule Regexes",
+            color=0x0099ff
+        )
+        
+        for rule_num, patterns in sorted(ruleset.regexes.items()):
+            embed.add_field(
+                name=f"Rule #{rule_num}" + (" (disabled)" if rule_num in ruleset.disabled else ""),
+                value="\n".join(f"• `{pattern}`" for pattern in patterns)[:1024],
+                inline=False
+            )
+        
+        if ruleset.quarantined:
+            embed.add_field(
+                name="⚠️ Quarantined (too slow)",
+                value="\n".join(f"• `{pattern}` (Rule #{rule_num})" for pattern, rule_num in ruleset.quarantined.items())[:1024],
+                inline=False
+            )
+        
+        if not embed.fields:
+            embed.description = "No custom regexes set."
+        
+        embed.set_footer(text=f"Worker timeouts: {self.regex_worker.timeouts}")
+        await ctx.reply(embed=embed)
+    
+    @commands.group(name='ruleconfig', invoke_without_command=True)
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def rule_config(self, ctx):
+        """Show which rules are monitored in this server"""
+        ruleset = self.rulesets.get(ctx.guild.id)
+        enabled = [rule_num for rule_num in self.rule_patterns if rule_num not in ruleset.disabled]
+        
+        embed = discord.Embed(
+            title="⚙️ Rule Monitoring Config",
+            description="Custom rules for this server." if ruleset is not self.rulesets.default else "Using the default rules.",
+            color=0x0099ff
+        )
+        embed.add_field(name="Enabled Rules", value=", ".join(f"#{rule_num}" for rule_num in enabled) or "None", inline=False)
+        embed.add_field(name="Disabled Rules", value=", ".join(f"#{rule_num}" for rule_num in sorted(ruleset.disabled)) or "None", inline=False)
+        embed.add_field(
+            name="Custom Patterns",
+            value=f"Keywords: {sum(len(terms) for terms in ruleset.keywords.values())}\n"
+                  f"Built-in keywords removed: {len(ruleset.removed_keywords)}\n"
+                  f"Regexes: {sum(len(patterns) for patterns in ruleset.regexes.values())}\n"
+                  f"Quarantined: {len(ruleset.quarantined)}",
+            inline=True
+        )
+        embed.add_field(
+            name="Exempt",
+            value="\n".join([f"<#{channel_id}>" for channel_id in ruleset.exempt_channels] +
+                            [f"<@&{role_id}>" for role_id in ruleset.exempt_roles])[:1024] or "Nothing",
+            inline=True
+        )
+        channels, roles = self.exemptions.get(ctx.guild.id)
+        embed.add_field(
+            name="Exempt in Total",
+            value=f"{len(channels)} channels, {len(roles)} roles (including categories, ticket channels and staff roles)",
+            inline=False
+        )
+        embed.set_footer(text=f"Version {ruleset.version} • Use -ruleconfig test <text> to try the rules")
+        await ctx.reply(embed=embed)
+    
+    async def _set_rule_enabled(self, ctx, rule_num, enabled):
+        if rule_num not in self.rule_patterns:
+            await ctx.reply(f"❌ There is no Rule #{rule_num}.", delete_after=10)
+            return
+        
+        await self.bot.storage.set_rule_enabled(ctx.guild.id, rule_num, enabled)
+        await self.refresh_rules(ctx.guild.id)
+        await ctx.reply(f"✅ Rule #{rule_num} {'enabled' if enabled else 'disabled'}.", delete_after=10)
+    
+    @rule_config.command(name='enable')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def rule_config_enable(self, ctx, rule_num: int):
+        """Monitor a rule again in this server"""
+        await self._set_rule_enabled(ctx, rule_num, True)
+    
+    @rule_config.command(name='disable')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def rule_config_disable(self, ctx, rule_num: int):
+        """Stop monitoring a rule in this server"""
+        await self._set_rule_enabled(ctx, rule_num, False)
+    
+    @rule_config.command(name='exempt')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def rule_config_exempt(self, ctx, target: Union[discord.TextChannel, discord.CategoryChannel, discord.Role]):
+        """Skip rule monitoring in a channel, a whole category or for members with a role"""
+        kind = 'role' if isinstance(target, discord.Role) else 'channel'
+        if await self.bot.storage.add_rule_exemption(ctx.guild.id, kind, target.id) is None:
+            await ctx.reply(f"ℹ️ {target.mention} is already exempt.", delete_after=10)
+            return
+        
+        await self.refresh_rules(ctx.guild.id)
+        await ctx.reply(f"✅ {target.mention} is now exempt from rule monitoring.", delete_after=10)
+    
+    @rule_config.command(name='unexempt')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def rule_config_unexempt(self, ctx, target: Union[discord.TextChannel, discord.CategoryChannel, discord.Role]):
+        """Monitor a channel or role again"""
+        kind = 'role' if isinstance(target, discord.Role) else 'channel'
+        if await self.bot.storage.remove_rule_exemption(ctx.guild.id, kind, target.id) is None:
+            await ctx.reply(f"ℹ️ {target.mention} was not exempt.", delete_after=10)
+            return
+        
+        await self.refresh_rules(ctx.guild.id)
+        await ctx.reply(f"✅ {target.mention} is monitored again.", delete_after=10)
+    
+    @rule_config.command(name='test')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def rule_config_test(self, ctx, *, text: str):
+        """Dry-run this server's rules against sample text, nothing is logged or sent"""
+        ruleset = self.rulesets.get(ctx.guild.id)
+        rule_num, rule_message = await ruleset.matcher.scan(text)
+        
+        if rule_num:
+            embed = discord.Embed(
+                title="🧪 Dry Run: Violation",
+                description=f"This text breaks **Rule #{rule_num}**.",
+                color=0xff9900
+            )
+            embed.add_field(name="Reminder", value=rule_message, inline=False)
+        else:
+            embed = discord.Embed(
+                title="🧪 Dry Run: Clean",
+                description="This text does not break any enabled rule.",
+                color=0x00ff00
+            )
+        
+        if ruleset.disabled:
+            default_rule, _ = self.rulesets.default.matcher.match(text)
+            if default_rule in ruleset.disabled:
+                embed.add_field(name="Disabled Rule", value=f"Rule #{default_rule} would also match, but it is disabled here.", inline=False)
+        
+        embed.set_footer(text=f"Ruleset version {ruleset.version}")
+        await ctx.reply(embed=embed)
+    
+    @commands.group(name='spamconfig', invoke_without_command=True)
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def spam_config(self, ctx):
+        """Show the spam detection thresholds for this server"""
+        limits = self.spam_detector.thresholds_for(ctx.guild.id)
+        custom = ctx.guild.id in self.spam_detector.guild_thresholds
+        
+        embed = discord.Embed(
+            title="🚦 Spam Detection Thresholds",
+            description="Custom thresholds for this server." if custom else "Using the default thresholds.",
+            color=0x0099ff
+        )
+        embed.add_field(name="Burst", value=f"`burst_count` {limits.burst_count} messages in `burst_seconds` {limits.burst_seconds:g}s", inline=False)
+        embed.add_field(name="Repeats", value=f"`repeat_count` {limits.repeat_count} identical messages in `repeat_seconds` {limits.repeat_seconds:g}s", inline=False)
+        embed.add_field(name="Mentions", value=f"`mention_count` {limits.mention_count} mentions in `mention_seconds` {limits.mention_seconds:g}s", inline=False)
+        embed.set_footer(text=f"Tracking {len(self.spam_detector)} users • Use -spamconfig set <name> <value> to change")
+        await ctx.reply(embed=embed)
+    
+    @spam_config.command(name='set')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def spam_config_set(self, ctx, name: str, value: float):
+        """Change one spam detection threshold for this server"""
+        try:
+            limits = self.spam_detector.thresholds_for(ctx.guild.id).replace(name.lower(), value)
+        except ValueError as e:
+            await ctx.reply(f"❌ {e}", delete_after=10)
+            return
+        
+        await self.bot.storage.set_spam_thresholds(ctx.guild.id, limits.to_dict())
+        self.spam_detector.guild_thresholds[ctx.guild.id] = limits
+        await ctx.reply(f"✅ `{name.lower()}` set to {value:g}.", delete_after=10)
+    
+    @spam_config.command(name='reset')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def spam_config_reset(self, ctx):
+        """Go back to the default spam detection thresholds"""
+        await self.bot.storage.delete_spam_thresholds(ctx.guild.id)
+        self.spam_detector.guild_thresholds.pop(ctx.guild.id, None)
+        await ctx.reply("✅ Spam detection thresholds reset to the defaults.", delete_after=10)
 
 async def setup(bot):
     await bot.add_cog(RuleMonitor(bot))
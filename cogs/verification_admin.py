@@ -1,46 +1,16 @@
 import discord
 from discord.ext import commands
-import json
-import os
-from datetime import datetime
+import time
 
 class VerificationAdmin(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.captcha_data_file = 'data/captcha_data.json'
-        self.cooldown_data_file = 'data/verification_cooldown.json'
+        self.storage = bot.storage
     
-    def load_captcha_data(self):
-        """Load captcha data from JSON file"""
-        try:
-            if os.path.exists(self.captcha_data_file):
-                with open(self.captcha_data_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
-    
-    def save_captcha_data(self, data):
-        """Save captcha data to JSON file"""
-        os.makedirs('data', exist_ok=True)
-        with open(self.captcha_data_file, 'w') as f:
-            json.dump(data, f, indent=2)
-    
-    def load_cooldown_data(self):
-        """Load cooldown data from JSON file"""
-        try:
-            if os.path.exists(self.cooldown_data_file):
-                with open(self.cooldown_data_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
-    
-    def save_cooldown_data(self, data):
-        """Save cooldown data to JSON file"""
-        os.makedirs('data', exist_ok=True)
-        with open(self.cooldown_data_file, 'w') as f:
-            json.dump(data, f, indent=2)
+    @property
+    def captcha_cog(self):
+        """The live captcha verification cog, or None if it is not loaded"""
+        return self.bot.get_cog('CaptchaVerification')
     
     @commands.command(name="verification_status")
     @commands.has_permissions(administrator=True)
@@ -54,12 +24,22 @@ class VerificationAdmin(commands.Cog):
         is_verified = verified_role and verified_role in user.roles
         
         # Check captcha data
-        captcha_data = self.load_captcha_data()
-        user_captcha = captcha_data.get(str(user.id), {})
+        captcha_cog = self.captcha_cog
+        if captcha_cog is not None:
+            session = captcha_cog.sessions.get(user.id)
+            user_captcha = {
+                'code': session.code,
+                'attempts': session.attempts,
+                'max_attempts': session.max_attempts
+            } if session else None
+        else:
+            user_captcha = await self.storage.get_captcha(user.id)
         
         # Check cooldown data
-        cooldown_data = self.load_cooldown_data()
-        user_cooldown = cooldown_data.get(str(user.id), {})
+        if captcha_cog is not None:
+            cooldown_end = captcha_cog.cooldowns.get(user.id)
+        else:
+            cooldown_end = await self.storage.get_cooldown(user.id)
         
         embed = discord.Embed(
             title=f"Verification Status - {user.display_name}",
@@ -80,12 +60,11 @@ class VerificationAdmin(commands.Cog):
                 inline=False
             )
         
-        if user_cooldown:
-            cooldown_end = datetime.fromisoformat(user_cooldown['cooldown_end'])
-            remaining = cooldown_end - datetime.now()
-            if remaining.total_seconds() > 0:
-                hours = int(remaining.total_seconds() // 3600)
-                minutes = int((remaining.total_seconds() % 3600) // 60)
+        if cooldown_end is not None:
+            remaining = cooldown_end - time.time()
+            if remaining > 0:
+                hours = int(remaining // 3600)
+                minutes = int((remaining % 3600) // 60)
                 embed.add_field(
                     name="Cooldown",
                     value=f"⏰ {hours}h {minutes}m remaining",
@@ -99,16 +78,17 @@ class VerificationAdmin(commands.Cog):
     async def clear_verification(self, ctx, user: discord.Member):
         """Clear verification data for a user"""
         # Clear captcha data
-        captcha_data = self.load_captcha_data()
-        if str(user.id) in captcha_data:
-            del captcha_data[str(user.id)]
-            self.save_captcha_data(captcha_data)
+        captcha_cog = self.captcha_cog
+        if captcha_cog is not None:
+            await captcha_cog.sessions.end(user.id)
+        else:
+            await self.storage.delete_captcha(user.id)
         
         # Clear cooldown data
-        cooldown_data = self.load_cooldown_data()
-        if str(user.id) in cooldown_data:
-            del cooldown_data[str(user.id)]
-            self.save_cooldown_data(cooldown_data)
+        if captcha_cog is not None:
+            await captcha_cog.cooldowns.remove(user.id)
+        else:
+            await self.storage.delete_cooldown(user.id)
         
         await ctx.send(f"✅ Cleared all verification data for {user.mention}")
     
@@ -116,19 +96,18 @@ class VerificationAdmin(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def verification_stats(self, ctx):
         """Show verification system statistics"""
-        captcha_data = self.load_captcha_data()
-        cooldown_data = self.load_cooldown_data()
-        
         # Count active captchas
-        active_captchas = len(captcha_data)
+        captcha_cog = self.captcha_cog
+        if captcha_cog is not None:
+            active_captchas = captcha_cog.sessions.live_count()
+        else:
+            active_captchas = await self.storage.count_captchas()
         
         # Count users on cooldown
-        current_time = datetime.now()
-        users_on_cooldown = 0
-        for user_id, data in cooldown_data.items():
-            cooldown_end = datetime.fromisoformat(data['cooldown_end'])
-            if current_time < cooldown_end:
-                users_on_cooldown += 1
+        if captcha_cog is not None:
+            users_on_cooldown = captcha_cog.cooldowns.active_count()
+        else:
+            users_on_cooldown = await self.storage.count_active_cooldowns(time.time())
         
         # Count verified users
         verified_role = ctx.guild.get_role(903238068910309398)
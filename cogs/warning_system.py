@@ -1,63 +1,44 @@
 import discord
 from discord.ext import commands
-import json
-import os
 from datetime import datetime
 
 class WarningSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.warnings_file = 'data/warnings.json'
-        self._ensure_warnings_file()
+        self.storage = bot.storage
+        self.warnings = {}  # (guild_id, user_id) -> warnings, oldest first
     
-    def _ensure_warnings_file(self):
-        """Ensure the warnings JSON file exists"""
-        os.makedirs('data', exist_ok=True)
-        if not os.path.exists(self.warnings_file):
-            with open(self.warnings_file, 'w') as f:
-                json.dump({}, f)
+    async def cog_load(self):
+        """Rebuild the in-memory warnings index by replaying storage"""
+        warnings = {}
+        for guild_id, user_id, warning in await self.storage.all_warnings():
+            warnings.setdefault((guild_id, user_id), []).append(warning)
+        self.warnings = warnings
     
-    def load_warnings(self):
-        """Load warnings from JSON file"""
-        try:
-            with open(self.warnings_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-    
-    def save_warnings(self, warnings_data):
-        """Save warnings to JSON file"""
-        with open(self.warnings_file, 'w') as f:
-            json.dump(warnings_data, f, indent=4)
-    
-    def add_warning(self, user_id, moderator_id, reason, guild_id):
+    async def add_warning(self, user_id, moderator_id, reason, guild_id):
         """Add a warning for a user"""
-        warnings_data = self.load_warnings()
-        
-        if str(guild_id) not in warnings_data:
-            warnings_data[str(guild_id)] = {}
-        
-        if str(user_id) not in warnings_data[str(guild_id)]:
-            warnings_data[str(guild_id)][str(user_id)] = []
-        
+        user_warnings = self.warnings.setdefault((guild_id, user_id), [])
         warning = {
-            'id': len(warnings_data[str(guild_id)][str(user_id)]) + 1,
+            'id': user_warnings[-1]['id'] + 1 if user_warnings else 1,
             'reason': reason,
             'moderator_id': moderator_id,
             'timestamp': datetime.now().isoformat(),
             'guild_id': guild_id
         }
         
-        warnings_data[str(guild_id)][str(user_id)].append(warning)
-        self.save_warnings(warnings_data)
+        # Index first so concurrent warns never hand out the same ID
+        user_warnings.append(warning)
+        try:
+            await self.storage.add_warning(guild_id, user_id, moderator_id, reason, warning['timestamp'], warning['id'])
+        except Exception:
+            user_warnings.remove(warning)
+            raise
         
         return warning['id']
     
     def get_user_warnings(self, user_id, guild_id):
         """Get all warnings for a user in a specific guild"""
-        warnings_data = self.load_warnings()
-        guild_warnings = warnings_data.get(str(guild_id), {})
-        return guild_warnings.get(str(user_id), [])
+        return list(self.warnings.get((guild_id, user_id), ()))
     
     @commands.command(name='warn')
     @commands.has_permissions(manage_messages=True)
@@ -91,7 +72,7 @@ class WarningSystem(commands.Cog):
             return
         
         # Add warning to database
-        warning_id = self.add_warning(user.id, ctx.author.id, reason, ctx.guild.id)
+        warning_id = await self.add_warning(user.id, ctx.author.id, reason, ctx.guild.id)
         
         # Log the warning
         logging_cog = self.bot.get_cog('ComprehensiveLogging')
@@ -146,7 +127,7 @@ class WarningSystem(commands.Cog):
         )
         embed.add_field(
             name="📊 Total Warnings",
-            value=f"{len(self.get_user_warnings(user.id, ctx.guild.id))}",
+            value=f"{len(self.warnings.get((ctx.guild.id, user.id), ()))}",
             inline=True
         )
         
@@ -279,12 +260,9 @@ class WarningSystem(commands.Cog):
         -clearwarnings @user - Clear all warnings
         -clearwarnings @user 1 - Clear specific warning ID
         """
-        warnings_data = self.load_warnings()
+        user_warnings = self.get_user_warnings(user.id, ctx.guild.id)
         
-        if str(ctx.guild.id) not in warnings_data:
-            warnings_data[str(ctx.guild.id)] = {}
-        
-        if str(user.id) not in warnings_data[str(ctx.guild.id)]:
+        if not user_warnings:
             embed = discord.Embed(
                 title="📋 No Warnings Found",
                 description=f"{user.mention} has no warnings to clear.",
@@ -293,13 +271,11 @@ class WarningSystem(commands.Cog):
             await ctx.reply(embed=embed, delete_after=10)
             return
         
-        user_warnings = warnings_data[str(ctx.guild.id)][str(user.id)]
-        
         if warning_id is None:
             # Clear all warnings
             warning_count = len(user_warnings)
-            warnings_data[str(ctx.guild.id)][str(user.id)] = []
-            self.save_warnings(warnings_data)
+            self.warnings.pop((ctx.guild.id, user.id), None)
+            await self.storage.clear_warnings(ctx.guild.id, user.id)
             
             # Log the warning clearance
             logging_cog = self.bot.get_cog('ComprehensiveLogging')
@@ -334,8 +310,8 @@ class WarningSystem(commands.Cog):
                 return
             
             # Remove the specific warning
-            warnings_data[str(ctx.guild.id)][str(user.id)] = [w for w in user_warnings if w['id'] != warning_id]
-            self.save_warnings(warnings_data)
+            self.warnings[(ctx.guild.id, user.id)].remove(warning_to_remove)
+            await self.storage.delete_warning(ctx.guild.id, user.id, warning_id)
             
             # Log the specific warning clearance
             logging_cog = self.bot.get_cog('ComprehensiveLogging')
@@ -0,0 +1,118 @@
+"""Equivalence fuzz and adversarial benchmark for RuleMatcher
+
+Checks the compiled matcher against the original pattern-by-pattern
+search on random messages, then times both on inputs built to make the
+backtracking engine work hard. Exits non-zero if a verdict differs or
+the matcher's worst case is over the limit.
+
+    python scripts/bench_rule_matcher.py [--messages 30000] [--limit-ms 5]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cogs.rule_monitor import RuleMonitor  # noqa: E402
+from utils.rule_matcher import RuleMatcher  # noqa: E402
+
+# No digits, `@` or `$`: folding maps those to letters for keywords, which the
+# original search never did, so they would make the two differ on purpose
+WORDS = (
+    'discord.gg', 'steam.com', 'scam', 'hack', 'bot', 'auto', 'script', 'macro', 'rob', 'steal', 'take',
+    'money', 'general', 'help', 'support', 'random', 'porn', 'nsfw', 'music bot', 'screaming', 'alt',
+    'main', 'beg', 'nitro', 'please', 'give', 'join my server', 'promote', 'exploit', 'bypass', 'hello',
+    'there', 'robot', 'helper', 'generally', 'xxxx', 'lol', 'ok', 'the', 'and'
+)
+PUNCTUATION = ('!', '?', '.', ',', '*', '#', '%', '^', '&', '(', ')', '_', '+', '-', '/')
+
+
+def original_match(rules, content):
+    """The search RuleMonitor did before patterns were compiled"""
+    lowered = content.lower()
+    for rule_num, rule_data in rules.items():
+        for pattern in rule_data['patterns']:
+            if re.search(pattern, lowered, re.IGNORECASE):
+                return rule_num
+    return None
+
+
+def random_message(rng):
+    parts = []
+    for _ in range(rng.randint(1, 12)):
+        roll = rng.random()
+        if roll < 0.6:
+            parts.append(rng.choice(WORDS))
+        elif roll < 0.75:
+            parts.append(rng.choice(PUNCTUATION) * rng.randint(1, 14))
+        elif roll < 0.85:
+            parts.append(rng.choice('abcxyz ') * rng.randint(2, 14))
+        elif roll < 0.92:
+            parts.append('\n')
+        else:
+            parts.append(''.join(rng.choice('abcdefghij') for _ in range(rng.randint(1, 70))))
+    return rng.choice((' ', '', '  ')).join(parts)
+
+
+def worst_ms(function, text, runs=5):
+    worst = 0.0
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(text)
+        worst = max(worst, time.perf_counter() - start)
+    return worst * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=30000)
+    parser.add_argument('--seed', type=int, default=12)
+    parser.add_argument('--limit-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    monitor = RuleMonitor(None)
+    if monitor.scan_queue is not None:
+        monitor.scan_queue._executor.shutdown()
+    rules = monitor.rule_patterns
+    matcher = RuleMatcher(rules)
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    flagged = 0
+    for _ in range(args.messages):
+        message = random_message(rng)
+        expected = original_match(rules, message)
+        got = matcher.match(message)[0]
+        flagged += expected is not None
+        if got != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f'mismatch: {message!r} original={expected} matcher={got}')
+    print(f'equivalence: {args.messages - mismatches}/{args.messages} messages agree ({flagged} flagged)')
+
+    cases = {
+        '"auto " x400 (no "bot")': 'auto ' * 400,
+        '"help " x400': 'help ' * 400,
+        '"take " x400 (no money)': 'take ' * 400,
+        '"main " x400 (no alt)': 'main ' * 400,
+        '"ab" x1000': 'ab' * 1000,
+        '"nitro " x333': 'nitro ' * 333,
+    }
+    worst = 0.0
+    print(f'{"input":<28} {"original":>10} {"matcher":>10}')
+    for name, text in cases.items():
+        old = worst_ms(lambda text: original_match(rules, text), text)
+        new = worst_ms(matcher.match, text)
+        worst = max(worst, new)
+        print(f'{name:<28} {old:>8.1f}ms {new:>8.1f}ms')
+    print(f'matcher worst case: {worst:.1f}ms (limit {args.limit_ms:g}ms)')
+
+    if mismatches or worst >= args.limit_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import time
+from collections import deque
+
+
+class Activity:
+    """One tracked action by a user"""
+
+    __slots__ = ('type', 'details', 'at', 'wall')
+
+    def __init__(self, activity_type, details, at, wall):
+        self.type = activity_type
+        self.details = details
+        # Monotonic seconds for windows, wall-clock seconds for display
+        self.at = at
+        self.wall = wall
+
+
+class WindowCounter:
+    """Events in the last `window` seconds, counted in fixed-width buckets
+
+    Adding and counting are O(1): at most `buckets` old buckets are
+    cleared when time moves on, however many events they held. The window
+    is exact to one bucket width.
+    """
+
+    __slots__ = ('width', 'counts', 'current', 'total')
+
+    def __init__(self, window=300, buckets=30):
+        self.width = window / buckets
+        self.counts = [0] * buckets
+        self.current = None
+        self.total = 0
+
+    def _advance(self, now):
+        bucket = int(now // self.width)
+        if self.current is None or bucket - self.current >= len(self.counts):
+            self.counts = [0] * len(self.counts)
+            self.total = 0
+        elif bucket > self.current:
+            for expired in range(self.current + 1, bucket + 1):
+                index = expired % len(self.counts)
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        else:
+            return
+        self.current = bucket
+
+    def add(self, now):
+        self._advance(now)
+        self.counts[self.current % len(self.counts)] += 1
+        self.total += 1
+
+    def count(self, now):
+        self._advance(now)
+        return self.total
+
+
+class UserActivity:
+    """A user's last `history` activities, with window counters for the types in `windowed`"""
+
+    __slots__ = ('activities', 'counters')
+
+    def __init__(self, history=50, windowed=(), window=300):
+        self.activities = deque(maxlen=history)
+        self.counters = {activity_type: WindowCounter(window) for activity_type in windowed}
+
+    @property
+    def last_activity(self):
+        """Wall-clock time of the newest activity, None if there is none"""
+        return self.activities[-1].wall if self.activities else None
+
+    def add(self, activity_type, details):
+        now = time.monotonic()
+        self.activities.append(Activity(activity_type, details, now, time.time()))
+        counter = self.counters.get(activity_type)
+        if counter is not None:
+            counter.add(now)
+
+    def count(self, activity_type):
+        """Activities of a windowed type inside the window"""
+        counter = self.counters.get(activity_type)
+        return counter.count(time.monotonic()) if counter is not None else 0
+
+    def recent(self, activity_type, seconds):
+        """Stored activities of a type from the last `seconds`, oldest first"""
+        since = time.monotonic() - seconds
+        return [activity for activity in self.activities if activity.type == activity_type and activity.at >= since]
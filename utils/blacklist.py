@@ -0,0 +1,79 @@
+import time
+
+from utils.jsonfile import atomic_dump, file_mtime, load_json
+
+
+class BlacklistService:
+    """In-memory set of blacklisted user IDs backed by data/blacklist.json
+
+    Membership is a frozenset lookup. The file is re-read when its mtime
+    changes (checked at most every `stat_interval` seconds) and the new
+    set replaces the old one in a single assignment.
+    """
+
+    def __init__(self, path='data/blacklist.json', stat_interval=5.0):
+        self.path = path
+        self.stat_interval = stat_interval
+        self._users = frozenset()
+        self._mtime = None
+        self._next_stat = 0.0
+        self.reload()
+
+    def reload(self):
+        """Load the blacklist from the JSON file"""
+        mtime = file_mtime(self.path)
+        data = load_json(self.path, [])
+
+        users = set()
+        for user_id in data:
+            try:
+                users.add(int(user_id))
+            except (TypeError, ValueError):
+                continue
+
+        self._users = frozenset(users)
+        self._mtime = mtime
+        self._next_stat = time.monotonic() + self.stat_interval
+
+    def _check_file(self):
+        """Reload if the file changed on disk since the last load"""
+        now = time.monotonic()
+        if now < self._next_stat:
+            return
+        self._next_stat = now + self.stat_interval
+        if file_mtime(self.path) != self._mtime:
+            self.reload()
+
+    def _save(self, users):
+        """Write the blacklist to disk and swap in the new set"""
+        atomic_dump(sorted(str(user_id) for user_id in users), self.path, indent=4)
+        self._users = frozenset(users)
+        self._mtime = file_mtime(self.path)
+
+    def __contains__(self, user_id):
+        self._check_file()
+        return user_id in self._users
+
+    def __len__(self):
+        self._check_file()
+        return len(self._users)
+
+    @property
+    def users(self):
+        """The current frozenset of blacklisted user IDs"""
+        self._check_file()
+        return self._users
+
+    def add(self, user_id):
+        """Blacklist a user, returns False if they already were"""
+        if user_id in self:
+            return False
+        self._save(self._users | {user_id})
+        return True
+
+    def remove(self, user_id):
+        """Remove a user from the blacklist, returns False if they were not on it"""
+        if user_id not in self:
+            return False
+        self._save(self._users - {user_id})
+        return True
@@ -0,0 +1,219 @@
+import asyncio
+import collections
+import functools
+import io
+import multiprocessing
+import os
+import random
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.logs import get_logger
+
+log = get_logger('captcha_render')
+
+CAPTCHA_FONT_PATH = os.getenv('CAPTCHA_FONT_PATH', 'data/fonts/captcha.ttf')
+
+# Lookup tables for the noise layer: roughly 1 in 256 pixels becomes a dot,
+# and dot colours are spread over the 150-220 range per channel
+_DOT_MASK_LUT = [255 if value == 255 else 0 for value in range(256)]
+_DOT_COLOR_LUT = [150 + value * 70 // 255 for value in range(256)]
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(size):
+    """Load the captcha font at a given size, cached per process
+
+    Tries the configured font, then Arial, then Pillow's bundled font.
+    Each size only ever hits the filesystem once.
+    """
+    for path in (CAPTCHA_FONT_PATH, 'arial.ttf'):
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+
+    try:
+        return ImageFont.load_default(size)
+    except (TypeError, OSError):
+        # Pillow < 10.1 has no scalable default font
+        return ImageFont.load_default()
+
+
+def noise_layer(size):
+    """Build a random dot layer and its mask in bulk, for a single paste"""
+    pixels = size[0] * size[1]
+    mask = Image.frombytes('L', size, os.urandom(pixels)).point(_DOT_MASK_LUT)
+    color = Image.merge('RGB', [
+        Image.frombytes('L', size, os.urandom(pixels)).point(_DOT_COLOR_LUT)
+        for _ in range(3)
+    ])
+    return color, mask
+
+
+def generate_code():
+    """Generate a random captcha string"""
+    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+
+
+def render_captcha(captcha_text):
+    """Render a captcha image with the given text and return the PNG bytes"""
+    # Create image with random background
+    width, height = 200, 80
+    bg_colors = [
+        (240, 248, 255),  # Alice Blue
+        (255, 250, 240),  # Floral White
+        (245, 245, 220),  # Beige
+        (255, 255, 240),  # Ivory
+        (248, 248, 255),  # Ghost White
+    ]
+    bg_color = random.choice(bg_colors)
+
+    # Create image
+    image = Image.new('RGB', (width, height), bg_color)
+    draw = ImageDraw.Draw(image)
+
+    # Add random noise lines
+    for _ in range(random.randint(8, 15)):
+        x1 = random.randint(0, width)
+        y1 = random.randint(0, height)
+        x2 = random.randint(0, width)
+        y2 = random.randint(0, height)
+        line_color = (random.randint(100, 200), random.randint(100, 200), random.randint(100, 200))
+        draw.line([(x1, y1), (x2, y2)], fill=line_color, width=random.randint(1, 3))
+
+    # Add random noise dots in one composite
+    dots, dots_mask = noise_layer((width, height))
+    image.paste(dots, (0, 0), dots_mask)
+
+    # Fonts are loaded once per size and reused
+    font = load_font(random.randint(24, 32))
+
+    # Draw the captcha text with random positioning and colors
+    text_color = (random.randint(0, 100), random.randint(0, 100), random.randint(0, 100))
+
+    # Calculate text position (center it roughly)
+    if font:
+        bbox = draw.textbbox((0, 0), captcha_text, font=font)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+    else:
+        text_width = len(captcha_text) * 10
+        text_height = 20
+
+    x = (width - text_width) // 2 + random.randint(-10, 10)
+    y = (height - text_height) // 2 + random.randint(-5, 5)
+
+    # Draw text with slight rotation
+    angle = random.randint(-15, 15)
+
+    # Create a temporary image for rotation
+    temp_img = Image.new('RGBA', (text_width + 20, text_height + 20), (0, 0, 0, 0))
+    temp_draw = ImageDraw.Draw(temp_img)
+
+    if font:
+        temp_draw.text((10, 10), captcha_text, fill=text_color, font=font)
+    else:
+        temp_draw.text((10, 10), captcha_text, fill=text_color)
+
+    # Rotate the text
+    rotated = temp_img.rotate(angle, expand=1)
+
+    # Paste rotated text onto main image
+    image.paste(rotated, (x-10, y-10), rotated)
+
+    # Add some distortion lines
+    for _ in range(random.randint(3, 6)):
+        x1 = random.randint(0, width)
+        y1 = random.randint(0, height)
+        x2 = random.randint(0, width)
+        y2 = random.randint(0, height)
+        line_color = (random.randint(200, 255), random.randint(200, 255), random.randint(200, 255))
+        draw.line([(x1, y1), (x2, y2)], fill=line_color, width=1)
+
+    # Convert to bytes
+    img_bytes = io.BytesIO()
+    image.save(img_bytes, format='PNG')
+
+    return img_bytes.getvalue()
+
+
+def render_random_captcha():
+    """Generate a code and render it, returns (code, PNG bytes)"""
+    code = generate_code()
+    return code, render_captcha(code)
+
+
+class CaptchaRenderer:
+    """Pool of pre-rendered captchas filled by worker processes
+
+    Rendering and PNG encoding run on a ProcessPoolExecutor, so the event
+    loop never draws images. Up to `pool_size` (code, PNG bytes) pairs are
+    kept ready; taking one is O(1) and wakes the background refill.
+    """
+
+    def __init__(self, pool_size=20, workers=2):
+        self.pool_size = pool_size
+        self.workers = workers
+        self._ready = collections.deque()
+        self._executor = None
+        self._refill_task = None
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._ready)
+
+    def start(self):
+        """Start the worker processes and the background refill"""
+        if self._executor is None:
+            # Never fork: the bot is threaded by now and a forked worker can
+            # deadlock on a lock some other thread was holding
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(start_method))
+        if self._refill_task is None:
+            self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def close(self):
+        """Stop the refill and shut the worker processes down"""
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            self._refill_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._ready.clear()
+
+    async def _refill_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            missing = self.pool_size - len(self._ready)
+            if missing <= 0:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            batch = [
+                loop.run_in_executor(self._executor, render_random_captcha)
+                for _ in range(min(missing, self.workers))
+            ]
+            try:
+                self._ready.extend(await asyncio.gather(*batch))
+            except Exception as e:
+                log.warning('captcha pool refill failed', error=str(e))
+                await asyncio.sleep(5)
+
+    async def render(self, code):
+        """Render a specific code on the worker processes"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, render_captcha, code)
+
+    async def take(self):
+        """Take a ready captcha, rendering one on demand if the pool is empty"""
+        self._wakeup.set()
+        if self._ready:
+            return self._ready.popleft()
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, render_random_captcha)
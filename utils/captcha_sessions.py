@@ -0,0 +1,117 @@
+import time
+from datetime import datetime
+
+
+class CaptchaSession:
+    """A pending captcha for one user"""
+
+    __slots__ = ('user_id', 'code', 'attempts', 'max_attempts', 'created_at', 'expires_at')
+
+    def __init__(self, user_id, code, max_attempts, created_at, expires_at, attempts=0):
+        self.user_id = user_id
+        self.code = code
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+    @property
+    def remaining_attempts(self):
+        return self.max_attempts - self.attempts
+
+    @property
+    def locked_out(self):
+        return self.attempts >= self.max_attempts
+
+
+class CaptchaSessionStore:
+    """In-memory captcha sessions with a time-to-live
+
+    Only terminal transitions touch storage: a session is written when it
+    is created and deleted when it is solved, locked out or expired.
+    Attempts are counted in memory, so a wrong guess costs no disk I/O.
+    Expired sessions are evicted lazily on lookup and by `evict_expired`.
+    """
+
+    def __init__(self, storage, ttl=600):
+        self.storage = storage
+        self.ttl = ttl
+        self._sessions = {}
+        self._evicted = []  # expired on lookup, still to be deleted from storage
+
+    async def load(self):
+        """Restore pending sessions from storage, dropping the expired ones"""
+        now = time.time()
+        self._sessions = {}
+        for row in await self.storage.pending_captchas():
+            created_at = datetime.fromisoformat(row['created_at']).timestamp()
+            session = CaptchaSession(
+                row['user_id'], row['code'], row['max_attempts'],
+                created_at, created_at + self.ttl, row['attempts']
+            )
+            if session.expires_at <= now:
+                self._evicted.append(session.user_id)
+            else:
+                self._sessions[session.user_id] = session
+        await self.evict_expired()
+
+    @property
+    def open_users(self):
+        """Live view of the user IDs with an open session, for cheap prefiltering"""
+        return self._sessions.keys()
+
+    def get(self, user_id):
+        """Get a user's live session, or None"""
+        session = self._sessions.get(user_id)
+        if session is not None and session.expires_at <= time.time():
+            del self._sessions[user_id]
+            self._evicted.append(user_id)
+            return None
+        return session
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def live_count(self, now=None):
+        """Count sessions that have not expired, skipping expired ones not evicted yet"""
+        now = now or time.time()
+        return sum(1 for session in self._sessions.values() if session.expires_at > now)
+
+    async def create(self, user_id, code, max_attempts=3):
+        """Start a new session for a user, replacing any existing one"""
+        now = time.time()
+        session = CaptchaSession(user_id, code, max_attempts, now, now + self.ttl)
+        self._sessions[user_id] = session
+        await self.storage.set_captcha(
+            user_id, code, max_attempts=max_attempts,
+            created_at=datetime.fromtimestamp(now).isoformat()
+        )
+        return session
+
+    async def end(self, user_id):
+        """End a user's session after it was solved, locked out or cleared"""
+        if self._sessions.pop(user_id, None) is None:
+            return False
+        await self.storage.delete_captcha(user_id)
+        return True
+
+    async def evict_expired(self):
+        """Evict expired sessions from memory and storage, returns how many were removed"""
+        now = time.time()
+        expired = [user_id for user_id, session in self._sessions.items() if session.expires_at <= now]
+        for user_id in expired:
+            del self._sessions[user_id]
+
+        expired.extend(self._evicted)
+        self._evicted = []
+        removed = 0
+        for user_id in expired:
+            # The user may have started a new session since, whose row must stay
+            if user_id in self._sessions:
+                continue
+            await self.storage.delete_captcha(user_id)
+            removed += 1
+        return removed
@@ -0,0 +1,90 @@
+import heapq
+import time
+
+
+class CooldownManager:
+    """Verification cooldowns kept in memory as epoch deadlines
+
+    Lookups are a dict hit. Expiry walks a min-heap of deadlines and only
+    pops entries that are due, so a cleanup pass costs O(expired * log n)
+    no matter how many cooldowns are active. Heap entries left behind by
+    re-added or removed users are skipped lazily and compacted away once
+    they outnumber the live ones.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._deadlines = {}  # user_id -> cooldown end (epoch seconds)
+        self._heap = []  # (cooldown end, user_id), may contain stale entries
+
+    async def load(self):
+        """Load every cooldown that has not ended yet from storage"""
+        self._deadlines = dict(await self.storage.active_cooldowns(time.time()))
+        self._heap = [(deadline, user_id) for user_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(deadline, user_id) for user_id, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def get(self, user_id, now=None):
+        """Get a user's cooldown end, or None if they are not on cooldown"""
+        deadline = self._deadlines.get(user_id)
+        if deadline is None or deadline <= (now or time.time()):
+            return None
+        return deadline
+
+    def remaining(self, user_id):
+        """Get the seconds left on a user's cooldown, or None"""
+        now = time.time()
+        deadline = self.get(user_id, now)
+        return deadline - now if deadline is not None else None
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def active_count(self, now=None):
+        """Count cooldowns that have not ended, without expiring any"""
+        now = now or time.time()
+        return sum(1 for deadline in self._deadlines.values() if deadline > now)
+
+    async def add(self, user_id, seconds):
+        """Put a user on cooldown for `seconds`"""
+        now = time.time()
+        deadline = now + seconds
+        self._deadlines[user_id] = deadline
+        heapq.heappush(self._heap, (deadline, user_id))
+        self._compact()
+        await self.storage.set_cooldown(user_id, deadline, now)
+
+    async def remove(self, user_id):
+        """Take a user off cooldown, returns False if they were not on one"""
+        if self._deadlines.pop(user_id, None) is None:
+            return False
+        self._compact()
+        await self.storage.delete_cooldown(user_id)
+        return True
+
+    def pop_expired(self, now=None):
+        """Drop every cooldown that is due and return the affected user IDs"""
+        now = now or time.time()
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, user_id = heapq.heappop(heap)
+            if self._deadlines.get(user_id) == deadline:
+                del self._deadlines[user_id]
+                expired.append(user_id)
+        return expired
+
+    async def expire(self):
+        """Expire due cooldowns in memory and in storage, returns how many ended"""
+        now = time.time()
+        expired = self.pop_expired(now)
+        if expired:
+            await self.storage.delete_expired_cooldowns(now)
+        return len(expired)
@@ -0,0 +1,58 @@
+class ExemptionIndex:
+    """Channels and roles whose messages skip rule monitoring, by guild
+
+    A guild's index holds its configured exemptions plus what can be
+    worked out from the guild itself: channels inside an exempt category,
+    channels named with one of `channel_prefixes` (ticket channels), and
+    with `exempt_staff` on, every role that can manage messages. It is
+    rebuilt when roles or channels change, so checking a message is a
+    couple of set lookups and one intersection with the author's roles.
+    """
+
+    def __init__(self, channel_prefixes=('ticket-',), exempt_staff=True):
+        self.channel_prefixes = tuple(prefix.lower() for prefix in channel_prefixes)
+        self.exempt_staff = exempt_staff
+        self.hits = 0
+        self.builds = 0
+        # guild_id -> (channel IDs, role IDs)
+        self._guilds = {}
+
+    def __len__(self):
+        return len(self._guilds)
+
+    def build(self, guild, ruleset):
+        """Recompute a guild's exempt channels and roles"""
+        channels = set(ruleset.exempt_channels)
+        for channel in guild.channels:
+            if getattr(channel, 'category_id', None) in ruleset.exempt_channels:
+                channels.add(channel.id)
+            elif self.channel_prefixes and channel.name.lower().startswith(self.channel_prefixes):
+                channels.add(channel.id)
+
+        roles = set(ruleset.exempt_roles)
+        if self.exempt_staff:
+            roles.update(
+                role.id for role in guild.roles
+                if role.permissions.manage_messages or role.permissions.administrator
+            )
+
+        self._guilds[guild.id] = (frozenset(channels), frozenset(roles))
+        self.builds += 1
+
+    def discard(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def get(self, guild_id):
+        """(channel IDs, role IDs) exempt in a guild, empty if it was never built"""
+        return self._guilds.get(guild_id, (frozenset(), frozenset()))
+
+    def check(self, guild_id, channel_id, parent_id, role_ids):
+        """Whether a message skips monitoring, threads follow their parent channel"""
+        entry = self._guilds.get(guild_id)
+        if entry is None:
+            return False
+        channels, roles = entry
+        if channel_id in channels or parent_id in channels or not roles.isdisjoint(role_ids):
+            self.hits += 1
+            return True
+        return False
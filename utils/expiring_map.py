@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+
+
+class ExpiringMap:
+    """Dict with a fixed TTL per entry and a hard size cap
+
+    Entries are kept in expiry order, which with a single TTL is just
+    insertion order, so expired keys are always at the front. Every
+    insert evicts the expired keys it finds there (each key is evicted
+    once, so this is amortized O(1)) and then the oldest keys if the map
+    is over `maxsize`. Lookups treat an expired key as missing. Deadlines
+    use a monotonic clock, so wall clock jumps do not matter.
+    """
+
+    def __init__(self, ttl, maxsize=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.expired = 0
+        self.evicted = 0
+        self._data = OrderedDict()
+
+    def _evict(self, now):
+        data = self._data
+        while data:
+            key, (deadline, _) = next(iter(data.items()))
+            if deadline > now:
+                break
+            del data[key]
+            self.expired += 1
+
+        while len(data) > self.maxsize:
+            data.popitem(last=False)
+            self.evicted += 1
+
+    def _entry(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._data[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def __setitem__(self, key, value):
+        now = self.clock()
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        self._evict(now)
+
+    def __getitem__(self, key):
+        entry = self._entry(key, self.clock())
+        if entry is None:
+            raise KeyError(key)
+        return entry[1]
+
+    def __delitem__(self, key):
+        if self._entry(key, self.clock()) is None:
+            raise KeyError(key)
+        del self._data[key]
+
+    def __contains__(self, key):
+        return self._entry(key, self.clock()) is not None
+
+    def __len__(self):
+        """Number of stored entries, including expired ones not evicted yet"""
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._entry(key, self.clock())
+        return default if entry is None else entry[1]
+
+    def pop(self, key, default=None):
+        entry = self._entry(key, self.clock())
+        if entry is None:
+            return default
+        del self._data[key]
+        return entry[1]
+
+    def remaining(self, key):
+        """Seconds until `key` expires, or 0 if it is not present"""
+        now = self.clock()
+        entry = self._entry(key, now)
+        return entry[0] - now if entry else 0
+
+    def purge(self):
+        """Evict every expired entry now, returns how many were removed"""
+        before = self.expired
+        self._evict(self.clock())
+        return self.expired - before
+
+    def clear(self):
+        self._data.clear()
@@ -0,0 +1,28 @@
+import json
+import os
+
+
+def file_mtime(path):
+    """Return the file's mtime in nanoseconds, or None if it does not exist"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_json(path, default):
+    """Load a JSON file, falling back to `default` if it is missing or invalid"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def atomic_dump(data, path, **kwargs):
+    """Write JSON to a temporary file and swap it into place"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
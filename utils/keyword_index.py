@@ -0,0 +1,109 @@
+import re
+from collections import deque
+
+# A `\b(word|other words|site\.com)\b` pattern with nothing but literals inside
+_KEYWORD_LIST = re.compile(r'^\\b\(([^()]*)\)\\b$')
+_METACHARS = set('.^$*+?{}[]\\|()')
+
+
+def literal_terms(pattern):
+    """Return the literal terms of a plain `\\b(a|b|c)\\b` keyword pattern, or None"""
+    match = _KEYWORD_LIST.match(pattern)
+    if match is None:
+        return None
+
+    terms = []
+    for alternative in match.group(1).split('|'):
+        term = alternative.replace('\\.', '.').replace('\\/', '/')
+        if not term or _METACHARS.intersection(term):
+            return None
+        terms.append(term)
+    return terms
+
+
+def _is_word(char):
+    return char.isalnum() or char == '_'
+
+
+def _at_boundary(text, index):
+    """Same test as the regex `\\b` assertion at `index`"""
+    before = index > 0 and _is_word(text[index - 1])
+    after = index < len(text) and _is_word(text[index])
+    return before != after
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over a fixed set of keywords
+
+    Immutable like the matcher that owns it: a changed keyword list gets a
+    new automaton.
+
+    `terms` maps each keyword to a rank, and a scan returns the lowest
+    rank among the keywords found with word boundaries on both sides.
+    """
+
+    def __init__(self, terms):
+        self.terms = dict(terms)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for term, rank in self.terms.items():
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] = ((term, len(term), rank),)
+
+        # Breadth-first pass for failure links, merging outputs along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+        self._alphabet = frozenset(char for edges in self._goto for char in edges)
+
+    def scan(self, text, limit=None, first=0):
+        """Return (rank, term) for the lowest ranked keyword in lowercase `text`, or None
+
+        Ranks below `first` or at or above `limit` are ignored, and the
+        scan stops early once rank `first` is found.
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        alphabet = self._alphabet
+        best = None
+        state = 0
+
+        for index, char in enumerate(text):
+            if char not in alphabet:
+                state = 0
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for term, length, rank in output[state]:
+                if rank < first or (limit is not None and rank >= limit):
+                    continue
+                start = index - length + 1
+                if _at_boundary(text, start) and _at_boundary(text, index + 1):
+                    best = (rank, term)
+                    limit = rank
+                    if rank == first:
+                        return best
+        return best
@@ -0,0 +1,267 @@
+import asyncio
+import time
+from collections import deque
+
+import discord
+
+from utils.logs import get_logger
+
+log = get_logger('log_dispatcher')
+
+# Discord's limits for one message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+# Priority lanes, most urgent first
+CRITICAL = 0
+NORMAL = 1
+BULK = 2
+LANES = (CRITICAL, NORMAL, BULK)
+LANE_NAMES = ('critical', 'normal', 'bulk')
+
+
+class _BulkGroup:
+    """Pending bulk events with the same key, sent one by one or as a summary"""
+
+    __slots__ = ('key', 'embeds', 'times', 'count', 'first_at', 'last_at', 'summarize', 'chars')
+
+    def __init__(self, key, summarize):
+        self.key = key
+        self.embeds = deque()
+        # Arrival time of each embed in `embeds`
+        self.times = deque()
+        # Pending events only, ones already sent one by one are not counted
+        self.count = 0
+        self.first_at = self.last_at = time.monotonic()
+        self.summarize = summarize
+        self.chars = 0
+
+
+class _ChannelBuffer:
+    """Embeds waiting to be sent to one channel, and the task sending them"""
+
+    __slots__ = ('channel', 'lanes', 'groups', 'size', 'chars', 'ready', 'full', 'task')
+
+    def __init__(self, channel):
+        self.channel = channel
+        # Critical and normal lanes hold (arrival time, embed), the bulk lane holds _BulkGroups
+        self.lanes = tuple(deque() for _ in LANES)
+        self.groups = {}
+        # Embeds that would be sent if everything pending went out now
+        self.size = 0
+        self.chars = 0
+        self.ready = asyncio.Event()
+        self.full = asyncio.Event()
+        self.task = None
+
+
+class LogDispatcher:
+    """Buffers log embeds per channel and sends them up to 10 at a time
+
+    Each channel has one sender task. Embeds are queued in one of three
+    lanes and each batch is filled by weighted round robin, `weights[lane]`
+    embeds from each lane per round, so critical logs jump a backlog of
+    bulk ones without starving them. Order is kept within a lane.
+
+    A batch is sent as soon as it has `MAX_EMBEDS` embeds, `max_chars`
+    characters or any critical embed, otherwise `linger` seconds after
+    its first embed arrived. Bulk events sharing a key are grouped, and
+    once more than `coalesce_after` of them are pending they go out as
+    one summary embed. `close` sends everything still buffered.
+    """
+
+    def __init__(self, linger=1.5, max_chars=MAX_EMBED_CHARS, weights=(6, 3, 1), coalesce_after=3):
+        self.linger = linger
+        self.max_chars = min(max_chars, MAX_EMBED_CHARS)
+        weights = tuple(weights)
+        if len(weights) != len(LANES) or any(not isinstance(weight, int) or weight < 1 for weight in weights):
+            log.warning('invalid lane weights, using defaults', weights=weights)
+            weights = (6, 3, 1)
+        self.weights = weights
+        self.coalesce_after = coalesce_after
+        self.queued = 0
+        self.sent = 0
+        self.messages = 0
+        self.failed = 0
+        self.sent_by_lane = [0] * len(LANES)
+        self.summaries = 0
+        self.coalesced = 0
+        self.started_at = time.monotonic()
+        self._buffers = {}
+        self._closing = False
+
+    @property
+    def pending(self):
+        return sum(buffer.size for buffer in self._buffers.values())
+
+    @property
+    def calls_saved(self):
+        """Messages not sent because their embeds shared a message with others"""
+        return self.sent - self.messages
+
+    def calls_saved_per_minute(self):
+        minutes = (time.monotonic() - self.started_at) / 60
+        return self.calls_saved / minutes if minutes > 0 else 0.0
+
+    def send(self, channel, embed, lane=NORMAL, key=None, summarize=None):
+        """Queue an embed for a channel, never blocks
+
+        Bulk embeds with a `key` are grouped with other pending embeds
+        under that key. `summarize(count, seconds)` builds the embed that
+        replaces a group once it grows past `coalesce_after`.
+        """
+        if self._closing:
+            raise RuntimeError('log dispatcher is closed')
+
+        buffer = self._buffers.get(channel.id)
+        if buffer is None:
+            buffer = self._buffers[channel.id] = _ChannelBuffer(channel)
+            buffer.task = asyncio.create_task(self._run(buffer))
+
+        self.queued += 1
+        if lane == BULK and key is not None and summarize is not None:
+            self._add_to_group(buffer, embed, key, summarize)
+        else:
+            buffer.lanes[lane].append((time.monotonic(), embed))
+            buffer.size += 1
+            buffer.chars += len(embed)
+
+        buffer.ready.set()
+        if lane == CRITICAL or buffer.size >= MAX_EMBEDS or buffer.chars >= self.max_chars:
+            buffer.full.set()
+
+    async def close(self):
+        """Send everything still buffered, then stop the sender tasks"""
+        self._closing = True
+        tasks = []
+        for buffer in self._buffers.values():
+            buffer.ready.set()
+            buffer.full.set()
+            tasks.append(buffer.task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _add_to_group(self, buffer, embed, key, summarize):
+        group = buffer.groups.get(key)
+        if group is None:
+            group = buffer.groups[key] = _BulkGroup(key, summarize)
+            buffer.lanes[BULK].append(group)
+            buffer.size += 1
+
+        now = time.monotonic()
+        if not group.count:
+            group.first_at = now
+        group.count += 1
+        group.last_at = now
+        group.summarize = summarize
+        if group.count > self.coalesce_after:
+            # Already a summary, the stored embeds are dropped for it
+            if group.embeds:
+                buffer.size -= len(group.embeds) - 1
+                buffer.chars -= group.chars
+                group.embeds.clear()
+                group.times.clear()
+                group.chars = 0
+            return
+
+        if group.embeds:
+            buffer.size += 1
+        group.embeds.append(embed)
+        group.times.append(now)
+        group.chars += len(embed)
+        buffer.chars += len(embed)
+
+    def _peek(self, buffer, lane):
+        """The next embed a lane would send, and its size"""
+        entry = buffer.lanes[lane][0]
+        if lane != BULK:
+            return entry[1], len(entry[1])
+        if entry.embeds:
+            return entry.embeds[0], len(entry.embeds[0])
+        embed = entry.summarize(entry.count, entry.last_at - entry.first_at)
+        return embed, len(embed)
+
+    def _pop(self, buffer, lane, size):
+        queue = buffer.lanes[lane]
+        buffer.size -= 1
+        if lane != BULK:
+            queue.popleft()
+            buffer.chars -= size
+            return
+
+        group = queue[0]
+        if group.embeds:
+            group.embeds.popleft()
+            group.times.popleft()
+            group.count -= 1
+            group.chars -= size
+            buffer.chars -= size
+            if group.embeds:
+                group.first_at = group.times[0]
+                return
+        else:
+            self.summaries += 1
+            self.coalesced += group.count
+        queue.popleft()
+        del buffer.groups[group.key]
+
+    def _oldest(self, buffer):
+        """Arrival time of the oldest embed still pending for a channel"""
+        times = [buffer.lanes[lane][0][0] for lane in (CRITICAL, NORMAL) if buffer.lanes[lane]]
+        # Groups are in creation order, but one sent in part has a later first_at than the next
+        times.extend(group.first_at for group in buffer.lanes[BULK])
+        return min(times)
+
+    def _take_batch(self, buffer):
+        batch = []
+        chars = 0
+        while len(batch) < MAX_EMBEDS:
+            taken = len(batch)
+            for lane in LANES:
+                for _ in range(self.weights[lane]):
+                    if not buffer.lanes[lane] or len(batch) >= MAX_EMBEDS:
+                        break
+                    embed, size = self._peek(buffer, lane)
+                    # An oversized embed still goes out, on its own
+                    if batch and chars + size > self.max_chars:
+                        break
+                    self._pop(buffer, lane, size)
+                    batch.append((lane, embed))
+                    chars += size
+            if len(batch) == taken:
+                break
+
+        if not buffer.lanes[CRITICAL] and buffer.size < MAX_EMBEDS and buffer.chars < self.max_chars and not self._closing:
+            buffer.full.clear()
+        return batch
+
+    async def _run(self, buffer):
+        while True:
+            if not buffer.size:
+                if self._closing:
+                    return
+                buffer.ready.clear()
+                await buffer.ready.wait()
+                continue
+
+            # The linger counts from when the oldest pending embed arrived, so
+            # embeds left over from the last batch do not wait a second time
+            delay = self.linger - (time.monotonic() - self._oldest(buffer))
+            if not buffer.full.is_set() and delay > 0:
+                try:
+                    await asyncio.wait_for(buffer.full.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._take_batch(buffer)
+            try:
+                await buffer.channel.send(embeds=[embed for _, embed in batch])
+                self.sent += len(batch)
+                self.messages += 1
+                for lane, _ in batch:
+                    self.sent_by_lane[lane] += 1
+            except discord.Forbidden:
+                self.failed += len(batch)
+                log.warning('log channel forbidden', channel_id=buffer.channel.id)
+            except Exception as e:
+                self.failed += len(batch)
+                log.error('log delivery failed', channel_id=buffer.channel.id, embeds=len(batch), error=str(e))
@@ -0,0 +1,108 @@
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import traceback
+
+ROOT_LOGGER = 'police_agent'
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as `time level logger event key=value ...`, then any traceback on the lines below"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value!r}' for key, value in fields.items())
+        trace = getattr(record, 'trace', None)
+        if trace:
+            line += '\n' + trace
+        return line
+
+
+class EventLogger:
+    """Named logger for one cog, with structured fields and sampled debug events
+
+    Per-message events should be guarded with `sampled()` so a message
+    pays one level check (and a random draw when debug is on) before any
+    fields are built.
+    """
+
+    def __init__(self, name, sample_rate=None):
+        self.logger = logging.getLogger(f'{ROOT_LOGGER}.{name}')
+        if sample_rate is None:
+            sample_rate = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+        self.sample_rate = sample_rate
+
+    def sampled(self):
+        """Whether this per-message debug event should be logged"""
+        return self.logger.isEnabledFor(logging.DEBUG) and random.random() < self.sample_rate
+
+    def log(self, level, event, exc_info=False, **fields):
+        if self.logger.isEnabledFor(level):
+            extra = {'fields': fields}
+            if exc_info:
+                # Formatted here, the exception is gone by the time the queue's writer sees the record
+                extra['trace'] = traceback.format_exc().rstrip()
+            self.logger.log(level, event, extra=extra)
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, exc_info=False, **fields):
+        """Log an error, with the traceback of the exception being handled if `exc_info` is set"""
+        self.log(logging.ERROR, event, exc_info=exc_info, **fields)
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    """Get the shared EventLogger for a cog or module"""
+    if name not in _loggers:
+        _loggers[name] = EventLogger(name)
+    return _loggers[name]
+
+
+def registered_loggers():
+    """Names of the loggers the bot's cogs and modules have created"""
+    return sorted(_loggers)
+
+
+def set_level(name, level):
+    """Change the level of one cog's logger, or of all of them with name None"""
+    logger = logging.getLogger(ROOT_LOGGER if name is None else f'{ROOT_LOGGER}.{name}')
+    logger.setLevel(level)
+    return logger
+
+
+def setup_logging(level=None, stream=None):
+    """Route the bot's loggers through a queue to a background writer
+
+    Returns the started QueueListener, stop it on shutdown to flush.
+    """
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level or os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.propagate = False
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
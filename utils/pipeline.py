@@ -0,0 +1,174 @@
+import time
+
+from utils.logs import get_logger
+from utils.text_fold import fold
+
+log = get_logger('pipeline')
+
+_UNSET = object()
+
+
+class MessageContext:
+    """Facts about one message, worked out once and shared by every stage"""
+
+    __slots__ = (
+        'pipeline', 'message', 'content', 'author_id', 'guild_id', 'is_bot', 'is_dm',
+        '_lowered', '_normalized', '_folded', '_is_command', '_role_ids', '_config'
+    )
+
+    def __init__(self, pipeline, message):
+        self.pipeline = pipeline
+        self.message = message
+        self.content = message.content
+        self.author_id = message.author.id
+        self.guild_id = message.guild.id if message.guild else None
+        self.is_bot = message.author.bot
+        self.is_dm = message.guild is None
+        self._lowered = None
+        self._normalized = None
+        self._folded = None
+        self._is_command = None
+        self._role_ids = None
+        self._config = {}
+
+    @property
+    def lowered(self):
+        if self._lowered is None:
+            self._lowered = self.content.lower()
+        return self._lowered
+
+    @property
+    def normalized(self):
+        """Lowercased with whitespace collapsed"""
+        if self._normalized is None:
+            self._normalized = ' '.join(self.lowered.split())
+        return self._normalized
+
+    @property
+    def folded(self):
+        """Lowercased with look-alikes, leetspeak and zero-width characters folded"""
+        if self._folded is None:
+            self._folded = fold(self.lowered)
+        return self._folded
+
+    @property
+    def is_command(self):
+        """Whether the message starts with one of the bot's prefixes here"""
+        if self._is_command is None:
+            bot = self.pipeline.bot
+            if self.is_dm:
+                prefixes = ('-',)
+            else:
+                prefixes = bot.prefixes.resolve(bot.user.id, self.guild_id)
+            self._is_command = self.content.startswith(tuple(prefixes))
+        return self._is_command
+
+    @property
+    def role_ids(self):
+        """IDs of the author's roles, empty in DMs"""
+        if self._role_ids is None:
+            roles = getattr(self.message.author, 'roles', ())
+            self._role_ids = frozenset(role.id for role in roles)
+        return self._role_ids
+
+    def config(self, name):
+        """Guild config from a provider registered on the pipeline, loaded once per message"""
+        value = self._config.get(name, _UNSET)
+        if value is _UNSET:
+            value = self._config[name] = self.pipeline.providers[name](self.guild_id)
+        return value
+
+
+class Stage:
+    """A registered pipeline stage and its timing counters"""
+
+    __slots__ = ('name', 'callback', 'priority', 'predicate', 'owner',
+                 'calls', 'skipped', 'stopped', 'errors', 'total_ns', 'max_ns')
+
+    def __init__(self, name, callback, priority, predicate, owner):
+        self.name = name
+        self.callback = callback
+        self.priority = priority
+        self.predicate = predicate
+        self.owner = owner
+        self.calls = 0
+        self.skipped = 0
+        self.stopped = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    @property
+    def average_ms(self):
+        return self.total_ns / self.calls / 1e6 if self.calls else 0.0
+
+
+class MessagePipeline:
+    """Runs every incoming message through the registered stages in order
+
+    Stages run by ascending priority. A stage's predicate is checked
+    first and should be cheap. A stage that returns True has consumed
+    the message, and the stages after it are skipped.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.providers = {}
+        self._provider_owners = {}
+        self._stages = []
+
+    @property
+    def stages(self):
+        return list(self._stages)
+
+    def register(self, name, callback, priority=100, predicate=None, owner=None):
+        """Add a stage, replacing any stage with the same name"""
+        self.unregister(name)
+        self._stages.append(Stage(name, callback, priority, predicate, owner))
+        self._stages.sort(key=lambda stage: stage.priority)
+
+    def unregister(self, name):
+        self._stages = [stage for stage in self._stages if stage.name != name]
+
+    def unregister_owner(self, owner):
+        """Drop every stage and config provider a cog registered"""
+        self._stages = [stage for stage in self._stages if stage.owner is not owner]
+        for name, provider_owner in list(self._provider_owners.items()):
+            if provider_owner is owner:
+                del self.providers[name]
+                del self._provider_owners[name]
+
+    def provide(self, name, provider, owner=None):
+        """Register `provider(guild_id)` as the source of `ctx.config(name)`"""
+        self.providers[name] = provider
+        self._provider_owners[name] = owner
+
+    async def dispatch(self, message):
+        ctx = MessageContext(self, message)
+        for stage in tuple(self._stages):
+            if stage.predicate is not None and not stage.predicate(ctx):
+                stage.skipped += 1
+                continue
+
+            start = time.perf_counter_ns()
+            try:
+                consumed = await stage.callback(ctx)
+            except Exception as e:
+                stage.errors += 1
+                consumed = False
+                log.error('stage failed', exc_info=True, stage=stage.name, message_id=message.id, error=repr(e))
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                stage.calls += 1
+                stage.total_ns += elapsed
+                stage.max_ns = max(stage.max_ns, elapsed)
+
+            if consumed is True:
+                stage.stopped += 1
+                break
+        return ctx
+
+    def reset_stats(self):
+        for stage in self._stages:
+            stage.calls = stage.skipped = stage.stopped = stage.errors = 0
+            stage.total_ns = stage.max_ns = 0
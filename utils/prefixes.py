@@ -0,0 +1,86 @@
+import time
+
+from utils.jsonfile import atomic_dump, file_mtime, load_json
+
+
+class PrefixRegistry:
+    """In-memory cache of guild prefixes backed by data/prefixes.json
+
+    The file is read once and then only re-read when its mtime changes.
+    The mtime itself is checked at most once every `stat_interval` seconds
+    so the message path never touches the disk.
+    """
+
+    def __init__(self, path='data/prefixes.json', default='-', stat_interval=5.0):
+        self.path = path
+        self.default = default
+        self.stat_interval = stat_interval
+        self._prefixes = {}
+        self._resolved = {}
+        self._mtime = None
+        self._next_stat = 0.0
+        self._bot_id = None
+        self._mentions = ()
+        self.reload()
+
+    def reload(self):
+        """Load prefixes from the JSON file"""
+        mtime = file_mtime(self.path)
+        data = load_json(self.path, {})
+
+        self._prefixes = {int(guild_id): prefix for guild_id, prefix in data.items()}
+        self._resolved.clear()
+        self._mtime = mtime
+        self._next_stat = time.monotonic() + self.stat_interval
+
+    def _check_file(self):
+        """Reload if the file changed on disk since the last load"""
+        now = time.monotonic()
+        if now < self._next_stat:
+            return
+        self._next_stat = now + self.stat_interval
+        if file_mtime(self.path) != self._mtime:
+            self.reload()
+
+    def _save(self):
+        """Write prefixes to disk atomically"""
+        atomic_dump({str(guild_id): prefix for guild_id, prefix in self._prefixes.items()}, self.path, indent=4)
+        self._mtime = file_mtime(self.path)
+
+    def mention_prefixes(self, bot_id):
+        """Return the cached mention prefixes for the bot user"""
+        if bot_id != self._bot_id:
+            self._bot_id = bot_id
+            self._mentions = (f'<@{bot_id}>', f'<@!{bot_id}>')
+            self._resolved.clear()
+        return self._mentions
+
+    def get(self, guild_id):
+        """Get the custom prefix for a guild"""
+        self._check_file()
+        return self._prefixes.get(guild_id, self.default)
+
+    def resolve(self, bot_id, guild_id):
+        """Get every prefix the bot listens to in a guild"""
+        mentions = self.mention_prefixes(bot_id)
+        self._check_file()
+
+        prefixes = self._resolved.get(guild_id)
+        if prefixes is None:
+            prefixes = (*mentions, self._prefixes.get(guild_id, self.default))
+            self._resolved[guild_id] = prefixes
+        return prefixes
+
+    def set(self, guild_id, prefix):
+        """Set a custom prefix for a guild and write it to disk"""
+        self._prefixes[guild_id] = prefix
+        self._resolved.pop(guild_id, None)
+        self._save()
+
+    def reset(self, guild_id):
+        """Remove a guild's custom prefix, returns False if it had none"""
+        if self._prefixes.pop(guild_id, None) is None:
+            return False
+        self._resolved.pop(guild_id, None)
+        self._save()
+        return True
@@ -0,0 +1,149 @@
+import hashlib
+import time
+from collections import deque
+
+from utils.expiring_map import ExpiringMap
+
+
+def normalize(content):
+    """Lowercase and collapse whitespace, so trivially altered copies match"""
+    return ' '.join(content.lower().split())
+
+
+def fingerprint(text):
+    """Stable 64-bit fingerprint of a piece of text"""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+
+def simhash(text, bits=64, shingle=4):
+    """SimHash over the character shingles of `text`, close texts differ in few bits"""
+    rows = [
+        format(fingerprint(text[start:start + shingle]), f'0{bits}b')
+        for start in range(max(1, len(text) - shingle + 1))
+    ]
+    # A bit is set when more than half of the shingles have it set,
+    # counted column by column over the binary strings
+    half = len(rows) / 2
+    return int(''.join('1' if column.count('1') > half else '0' for column in zip(*rows)), 2)
+
+
+class _Wave:
+    """Hits for one fingerprint inside one time bucket"""
+
+    __slots__ = ('count', 'users', 'channels', 'sample', 'simhash')
+
+    def __init__(self, sample, simhash):
+        self.count = 0
+        self.users = set()
+        self.channels = set()
+        self.sample = sample
+        self.simhash = simhash
+
+
+class RaidDetector:
+    """Spots the same payload posted by many users across a guild
+
+    Messages are fingerprinted after normalization and counted in time
+    buckets that together cover `window` seconds. When one fingerprint
+    has been posted by `threshold` different users inside the window,
+    `observe` returns a single aggregated alert for it, and the wave is
+    not reported again until it dies down.
+
+    With `near_duplicates` on, a SimHash is also kept per fingerprint and
+    indexed by 8-bit bands, so payloads with a few words changed count
+    towards the same wave. With 8 bands, any SimHash within 7 bits shares
+    at least one band and is always found.
+    """
+
+    BANDS = 8
+    MAX_DISTANCE = 7
+
+    def __init__(self, threshold=5, window=60, buckets=6, min_length=12, near_duplicates=False, clock=time.monotonic):
+        self.threshold = threshold
+        self.window = window
+        self.bucket_seconds = window / buckets
+        self.bucket_count = buckets
+        self.min_length = min_length
+        self.near_duplicates = near_duplicates
+        self.clock = clock
+        self.alerts = 0
+        # (bucket index, {(guild_id, fingerprint): _Wave}, {(guild_id, band, value): key})
+        self._buckets = deque()
+        self._alerted = ExpiringMap(ttl=window, maxsize=10000, clock=clock)
+
+    def _rotate(self, now):
+        index = int(now // self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != index:
+            self._buckets.append((index, {}, {}))
+        while self._buckets[0][0] <= index - self.bucket_count:
+            self._buckets.popleft()
+
+    def _bands(self, value):
+        width = 64 // self.BANDS
+        mask = (1 << width) - 1
+        return [(band, value >> (band * width) & mask) for band in range(self.BANDS)]
+
+    def _near(self, guild_id, value):
+        """Key of a wave in the window whose SimHash is close to `value`, or None"""
+        for band, part in self._bands(value):
+            for _, waves, bands in reversed(self._buckets):
+                key = bands.get((guild_id, band, part))
+                if key is not None and bin(waves[key].simhash ^ value).count('1') <= self.MAX_DISTANCE:
+                    return key
+        return None
+
+    def observe(self, guild_id, channel_id, user_id, content, normalized=None):
+        """Count a message, returns an alert dict the first time its wave crosses the threshold"""
+        normalized = normalized if normalized is not None else normalize(content)
+        if len(normalized) < self.min_length:
+            return None
+
+        now = self.clock()
+        self._rotate(now)
+        key = (guild_id, fingerprint(normalized))
+        waves, bands = self._buckets[-1][1], self._buckets[-1][2]
+
+        value = None
+        if self.near_duplicates:
+            value = simhash(normalized)
+            if not any(key in bucket_waves for _, bucket_waves, _ in self._buckets):
+                key = self._near(guild_id, value) or key
+
+        wave = waves.get(key)
+        if wave is None:
+            wave = waves[key] = _Wave(normalized[:200], value)
+            if value is not None:
+                for band, part in self._bands(value):
+                    bands[(guild_id, band, part)] = key
+        wave.count += 1
+        wave.users.add(user_id)
+        wave.channels.add(channel_id)
+
+        if key in self._alerted:
+            # Keep the alert suppressed while the wave is still going
+            self._alerted[key] = True
+            return None
+
+        users = set()
+        for _, bucket_waves, _ in self._buckets:
+            if key in bucket_waves:
+                users |= bucket_waves[key].users
+        if len(users) < self.threshold:
+            return None
+
+        self._alerted[key] = True
+        self.alerts += 1
+        channels = set()
+        messages = 0
+        for _, bucket_waves, _ in self._buckets:
+            if key in bucket_waves:
+                channels |= bucket_waves[key].channels
+                messages += bucket_waves[key].count
+        return {
+            'fingerprint': f'{key[1]:016x}',
+            'sample': wave.sample,
+            'messages': messages,
+            'users': users,
+            'channels': channels,
+            'window': self.window
+        }
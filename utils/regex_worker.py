@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import multiprocessing
+import re
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern, flags):
+    return re.compile(pattern, flags)
+
+
+def _serve(conn, current):
+    """Child process loop: answer (patterns, text) with the index of the first match"""
+    conn.send('ready')
+    while True:
+        try:
+            patterns, text, flags = conn.recv()
+        except EOFError:
+            return
+
+        found = None
+        for index, pattern in enumerate(patterns):
+            # Published before each search so a stuck pattern can be named
+            current.value = index
+            if _compile(pattern, flags).search(text):
+                found = index
+                break
+        current.value = -1
+        conn.send(found)
+
+
+class RegexWorker:
+    """Runs untrusted regexes in a child process with a time budget
+
+    A search that overruns the budget kills the child, which is respawned
+    on the next call, and the pattern that was running is reported back
+    so the caller can quarantine it.
+    """
+
+    def __init__(self, budget=0.05):
+        self.budget = budget
+        self.timeouts = 0
+        # Never fork: the bot is threaded by now (storage, scans, logging) and a
+        # forked child can deadlock on a lock some other thread was holding
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._context = multiprocessing.get_context(start_method)
+        self._process = None
+        self._conn = None
+        self._current = None
+        self._lock = asyncio.Lock()
+
+    def _spawn(self):
+        parent, child = self._context.Pipe()
+        self._current = self._context.Value('i', -1, lock=False)
+        self._process = self._context.Process(target=_serve, args=(child, self._current), daemon=True)
+        self._process.start()
+        child.close()
+        self._conn = parent
+
+        # Startup time does not count against the budget
+        if not parent.poll(10) or parent.recv() != 'ready':
+            self._kill()
+            raise RuntimeError('regex worker failed to start')
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def _search(self, patterns, text, flags):
+        if self._process is None or not self._process.is_alive():
+            self._spawn()
+
+        self._conn.send((patterns, text, flags))
+        if self._conn.poll(self.budget):
+            return self._conn.recv(), None
+
+        stuck = self._current.value
+        self._kill()
+        self.timeouts += 1
+        return None, stuck if stuck >= 0 else None
+
+    async def search(self, patterns, text, flags=0):
+        """Return (index of the first matching pattern, index of a pattern that timed out)
+
+        Both values are None when nothing matched within the budget.
+        """
+        if not patterns:
+            return None, None
+        async with self._lock:
+            return await asyncio.to_thread(self._search, tuple(patterns), text, flags)
+
+    async def close(self):
+        """Stop the child process"""
+        async with self._lock:
+            await asyncio.to_thread(self._kill)
@@ -0,0 +1,223 @@
+import re
+
+from utils.keyword_index import KeywordAutomaton, literal_terms
+from utils.scanners import compile_scanner
+from utils.text_fold import fold
+
+_BACKREF = re.compile(r'\\(\d+)')
+
+
+def _shift_backrefs(pattern, offset):
+    """Renumber numeric backreferences so a pattern can sit after `offset` groups"""
+    if not offset:
+        return pattern
+    return _BACKREF.sub(lambda match: '\\%d' % (int(match.group(1)) + offset), pattern)
+
+
+def _join_patterns(patterns, offset, flags):
+    """Join patterns into one alternation, returns (source, number of groups)"""
+    parts = []
+    groups = 0
+    for pattern in patterns:
+        parts.append('(?:%s)' % _shift_backrefs(pattern, offset + groups))
+        groups += re.compile(pattern, flags).groups
+    return '|'.join(parts), groups
+
+
+class RuleMatcher:
+    """Compiled form of a rule table
+
+    Plain `\\b(word|word)\\b` keyword lists go into one Aho-Corasick
+    keyword index, so a single linear pass finds every keyword hit.
+    Structural patterns (repeats, long lines, character runs and `a.*b`
+    co-occurrence) become linear-time scanners. Anything else is compiled
+    once into a single alternation with one named group per rule, plus
+    one alternation per rule. Either way the first rule in table order
+    wins, exactly like searching every pattern in turn.
+
+    Keywords, co-occurrence scanners and the table's regexes see the text
+    after `fold`, so look-alike letters, leetspeak and zero-width
+    characters do not hide a word. Shape checks (repeats, long lines,
+    character runs) and custom regexes see the plain lowercased text, so
+    a custom regex with digits, `@` or `$` still matches.
+
+    `keywords` and `custom_patterns` map rule numbers to extra keywords
+    and regexes on top of the table. An extra keyword takes the term over
+    from whichever rule of the table lists it, and terms in
+    `removed_keywords` are left out of the table's keyword lists.
+
+    Custom regexes are untrusted and only ever run in the `worker`
+    process, under its time budget. A regex that
+    overruns the budget is skipped from then on and reported through
+    `on_quarantine(rule_num, pattern)`.
+
+    The rules of a matcher never change after it is built. To change
+    them, build a new one.
+    """
+
+    def __init__(self, rules, flags=re.IGNORECASE, worker=None, keywords=None, custom_patterns=None, on_quarantine=None,
+                 removed_keywords=None):
+        self.order = list(rules)
+        self.flags = flags
+        self.worker = worker
+        self.on_quarantine = on_quarantine
+        self.messages = {rule_num: rule_data['message'] for rule_num, rule_data in rules.items()}
+        self._positions = {rule_num: position for position, rule_num in enumerate(self.order)}
+        self.custom_patterns = {
+            rule_num: list(patterns)
+            for rule_num, patterns in (custom_patterns or {}).items()
+            if rule_num in self._positions and patterns
+        }
+        self._quarantined = set()
+        self._rule_regexes = []
+        self._scanners = []
+        self._group_rules = {}
+
+        removed = {fold(term.lower()) for term in removed_keywords or ()}
+        terms = {}
+        parts = []
+        offset = 0
+        for position, rule_num in enumerate(self.order):
+            patterns = []
+            for pattern in rules[rule_num]['patterns']:
+                literals = literal_terms(pattern)
+                if literals is not None:
+                    for term in literals:
+                        term = fold(term.lower())
+                        if term not in removed:
+                            terms.setdefault(term, position)
+                    continue
+
+                scanner = compile_scanner(pattern, flags)
+                if scanner is not None:
+                    self._scanners.append((position, scanner))
+                else:
+                    patterns.append(pattern)
+
+            if not patterns:
+                continue
+
+            group = f'rule_{position}'
+            source, groups = _join_patterns(patterns, offset + 1, flags)
+            parts.append(f'(?P<{group}>{source})')
+            offset += groups + 1
+
+            self._group_rules[group] = position
+            self._rule_regexes.append((position, re.compile(_join_patterns(patterns, 0, flags)[0], flags)))
+
+        for rule_num, extra in (keywords or {}).items():
+            if rule_num in self._positions:
+                for term in extra:
+                    terms[fold(term.lower())] = self._positions[rule_num]
+
+        self.keywords = KeywordAutomaton(terms)
+        self._combined = re.compile('|'.join(parts), flags) if parts else None
+
+    def keywords_for(self, rule_num):
+        """Sorted keywords currently flagged under a rule"""
+        position = self._positions[rule_num]
+        return sorted(term for term, rank in self.keywords.terms.items() if rank == position)
+
+    def keyword_rule(self, term):
+        """Rule number that owns a folded keyword, or None if it is not flagged"""
+        position = self.keywords.terms.get(term)
+        return self.order[position] if position is not None else None
+
+    def rule_after(self, rule_num):
+        """The rule checked after `rule_num`, or None if it is the last"""
+        position = self._positions[rule_num] + 1
+        return self.order[position] if position < len(self.order) else None
+
+    def _search_patterns(self, text, folded, limit, start=0):
+        """Position of the first rule from `start` and before `limit` whose patterns match, else `limit`"""
+        best = limit
+        if start:
+            # The combined regex reports the leftmost match, which may belong to a skipped rule
+            for position, regex in self._rule_regexes:
+                if best is not None and position >= best:
+                    break
+                if position >= start and regex.search(folded):
+                    best = position
+                    break
+        elif self._combined is not None:
+            found = self._combined.search(folded)
+            if found is not None:
+                position = self._group_rules[found.lastgroup]
+                if best is None or position < best:
+                    best = position
+                for position, regex in self._rule_regexes:
+                    if position >= best:
+                        break
+                    if regex.search(folded):
+                        best = position
+                        break
+
+        for position, scanner in self._scanners:
+            if best is not None and position >= best:
+                break
+            if position >= start and scanner.search(folded if scanner.folded else text):
+                return position
+        return best
+
+    def _start(self, rule_num):
+        return self._positions[rule_num] if rule_num is not None else 0
+
+    def _position(self, content, folded=None, start=None):
+        text = content.lower()
+        folded = folded if folded is not None else fold(text)
+        first = self._start(start)
+        hit = self.keywords.scan(folded, first=first)
+        return text, self._search_patterns(text, folded, hit[0] if hit else None, first)
+
+    def _result(self, position):
+        if position is None:
+            return None, None
+        rule_num = self.order[position]
+        return rule_num, self.messages[rule_num]
+
+    def match(self, content, folded=None, start=None):
+        """Return (rule_num, message) for the first built-in rule the content breaks, or (None, None)
+
+        Pass `folded` if `fold(content.lower())` is already known. With
+        `start`, rules before that rule number are not checked.
+        """
+        return self._result(self._position(content, folded, start)[1])
+
+    def locate(self, content, folded=None, start=None):
+        """First half of `scan`: (lowercased text, position of the first built-in rule hit)
+
+        Only reads the matcher, so it is safe to run on another thread.
+        """
+        return self._position(content, folded, start)
+
+    async def resolve(self, text, position, start=None):
+        """Second half of `scan`: run the user-supplied regexes that could still win on the lowercased text"""
+        if not self.custom_patterns or self.worker is None:
+            return self._result(position)
+
+        first = self._start(start)
+        candidates = [
+            (self._positions[rule_num], pattern)
+            for rule_num, patterns in self.custom_patterns.items()
+            for pattern in patterns
+            if first <= self._positions[rule_num] and (position is None or self._positions[rule_num] < position)
+            and pattern not in self._quarantined
+        ]
+        if not candidates:
+            return self._result(position)
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        found, stuck = await self.worker.search([pattern for _, pattern in candidates], text, self.flags)
+        if stuck is not None:
+            pattern = candidates[stuck][1]
+            rule_num = self.order[candidates[stuck][0]]
+            self._quarantined.add(pattern)
+            if self.on_quarantine is not None:
+                await self.on_quarantine(rule_num, pattern)
+        if found is not None:
+            position = candidates[found][0]
+        return self._result(position)
+
+    async def scan(self, content, folded=None, start=None):
+        """Like `match`, but also runs the user-supplied regexes in the worker"""
+        return await self.resolve(*self.locate(content, folded, start), start)
@@ -0,0 +1,95 @@
+import asyncio
+
+from utils.logs import get_logger
+from utils.rule_matcher import RuleMatcher
+
+log = get_logger('rulesets')
+
+
+class Ruleset:
+    """One guild's rule config compiled into a matcher
+
+    Rulesets are replaced, never changed, so a message that picked one up
+    keeps a consistent view of the rules while a new version is built.
+    """
+
+    __slots__ = ('guild_id', 'version', 'matcher', 'disabled', 'keywords', 'regexes', 'quarantined',
+                 'removed_keywords', 'exempt_channels', 'exempt_roles')
+
+    def __init__(self, guild_id, version, matcher, config):
+        self.guild_id = guild_id
+        self.version = version
+        self.matcher = matcher
+        self.disabled = frozenset(config.get('disabled', ()))
+        self.keywords = {rule_num: tuple(terms) for rule_num, terms in config.get('keywords', {}).items()}
+        self.regexes = {rule_num: tuple(patterns) for rule_num, patterns in config.get('regexes', {}).items()}
+        self.quarantined = dict(config.get('quarantined', {}))
+        self.removed_keywords = frozenset(config.get('removed_keywords', ()))
+        self.exempt_channels = frozenset(config.get('exempt_channels', ()))
+        self.exempt_roles = frozenset(config.get('exempt_roles', ()))
+
+    @property
+    def cache_key(self):
+        """Identifies these exact rules, for caching verdicts"""
+        return self.guild_id, self.version
+
+
+class RulesetCache:
+    """Compiled rulesets by guild, rebuilt only when a guild's config version changes
+
+    Guilds that never changed their rules share one default ruleset built
+    from the base table. `get` is a single dict lookup, so it is cheap
+    enough for the message path. Builds run in a thread so compiling a
+    large config does not stall the event loop.
+    """
+
+    def __init__(self, rules, worker=None, on_quarantine=None):
+        self.rules = rules
+        self.worker = worker
+        self.on_quarantine = on_quarantine
+        self.builds = 0
+        self.default = self.compile(None, {'version': 0})
+        self._rulesets = {}
+
+    def __len__(self):
+        return len(self._rulesets)
+
+    def get(self, guild_id):
+        return self._rulesets.get(guild_id, self.default)
+
+    def compile(self, guild_id, config):
+        """Build a Ruleset for a config dict as returned by Storage.get_rule_config"""
+        disabled = config.get('disabled', ())
+        rules = {rule_num: rule_data for rule_num, rule_data in self.rules.items() if rule_num not in disabled}
+
+        on_quarantine = None
+        if guild_id is not None and self.on_quarantine is not None:
+            async def on_quarantine(rule_num, pattern):
+                await self.on_quarantine(guild_id, rule_num, pattern)
+
+        matcher = RuleMatcher(
+            rules,
+            worker=self.worker,
+            keywords=config.get('keywords'),
+            custom_patterns=config.get('regexes'),
+            on_quarantine=on_quarantine,
+            removed_keywords=config.get('removed_keywords')
+        )
+        self.builds += 1
+        return Ruleset(guild_id, config['version'], matcher, config)
+
+    async def update(self, guild_id, config):
+        """Swap in a new build of a guild's rules unless this version is already loaded"""
+        current = self._rulesets.get(guild_id)
+        if current is not None and current.version >= config['version']:
+            return current
+
+        ruleset = await asyncio.to_thread(self.compile, guild_id, config)
+        # Another update may have finished first while this one was building
+        current = self._rulesets.get(guild_id)
+        if current is not None and current.version >= ruleset.version:
+            return current
+
+        self._rulesets[guild_id] = ruleset
+        log.info('ruleset built', guild_id=guild_id, version=ruleset.version)
+        return ruleset
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logs import get_logger
+
+log = get_logger('scan_queue')
+
+# Result for an item whose scan raised, it gets no on_result call
+_FAILED = object()
+
+
+class ScanQueue:
+    """Runs CPU-bound scans off the event loop in micro-batches
+
+    `submit` never blocks. A worker task takes up to `batch_size` items,
+    waiting at most `linger` seconds for a batch to fill, and hands the
+    batch to a thread pool, which calls `scan(item)` on each. Each result
+    is handed back to the loop as its own `on_result(item, result)` task,
+    so slow follow-ups (API calls) do not hold up the next batch.
+
+    The queue is bounded. `submit` returns False when it is full, and
+    `saturated` turns on once it is `high_water` full, so callers can
+    shed work before that happens.
+
+    A scan that raises is logged and counted in `failed`. Only that item
+    is skipped, the rest of its batch is delivered as usual.
+    """
+
+    def __init__(self, scan, on_result, batch_size=32, linger=0.005, maxsize=1000, high_water=0.8, threads=1):
+        self.scan = scan
+        self.on_result = on_result
+        self.batch_size = batch_size
+        self.linger = linger
+        self.maxsize = maxsize
+        self.high_water = max(1, int(maxsize * high_water))
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.scanned = 0
+        self.max_depth = 0
+        self.max_latency = 0.0
+        # Seconds from submit to result for the most recent scans
+        self.latencies = deque(maxlen=1024)
+        self._queue = asyncio.Queue(maxsize)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='rule-scan')
+        self._task = None
+        self._pending = set()
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    @property
+    def saturated(self):
+        return self._queue.qsize() >= self.high_water
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the worker, dropping anything still queued, and wait for results already handed out"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # on_result may still need resources the caller is about to close
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def submit(self, item):
+        """Queue an item for scanning, returns False if the queue is full"""
+        try:
+            self._queue.put_nowait((time.perf_counter(), item))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def latency_percentile(self, percentile):
+        """Latency in seconds at a percentile of the recent scans, 0 if there were none"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def _scan_batch(self, items):
+        results = []
+        for item in items:
+            try:
+                results.append(self.scan(item))
+            except Exception as e:
+                log.error('scan failed', error=repr(e))
+                results.append(_FAILED)
+            # Regex work holds the GIL. Give it up between items so the
+            # event loop waits for one scan at most, not a whole batch
+            time.sleep(0)
+        return results
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            items = [item for _, item in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._scan_batch, items)
+            except Exception as e:
+                log.error('batch scan failed', size=len(items), error=repr(e))
+                continue
+
+            now = time.perf_counter()
+            self.batches += 1
+            self.scanned += len(items)
+            for (submitted_at, item), result in zip(batch, results):
+                if result is _FAILED:
+                    self.failed += 1
+                    continue
+                latency = now - submitted_at
+                self.latencies.append(latency)
+                self.max_latency = max(self.max_latency, latency)
+
+                task = asyncio.create_task(self._deliver(item, result))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+
+    async def _deliver(self, item, result):
+        try:
+            await self.on_result(item, result)
+        except Exception as e:
+            log.error('scan result handler failed', error=repr(e))
@@ -0,0 +1,154 @@
+import operator
+import re
+
+# Linear-time stand-ins for the structural regexes in the rule table.
+# Each factory takes a pattern source and returns a scanner with a
+# `search(text)` method, or None if the pattern does not have that shape.
+
+_REPEATED_UNIT = re.compile(r'^\(\.\{1,(\d+)\}\)\\1\{(\d+),\}$')
+_REPEATED_CHAR = re.compile(r'^\(\.\)\\1\{(\d+),\}$')
+_LONG_LINE = re.compile(r'^\(?\.\)?\{(\d+),\}$')
+_CHAR_RUN = re.compile(r'^\[([^\]\\^-][^\]\\-]*)\]\{(\d+),\}$')
+
+
+class RepeatScanner:
+    """A unit of up to `max_unit` characters repeated `times` times in a row
+
+    Same result as `(.{1,N})\\1{K,}`. For each unit length the line is
+    compared against itself shifted by that length, and a long enough
+    run of equal characters means a repeat, so the cost stays linear.
+    """
+
+    folded = False
+
+    def __init__(self, max_unit, times):
+        self.max_unit = max_unit
+        self.times = times
+
+    def search(self, text):
+        for line in text.split('\n'):
+            for unit in range(1, self.max_unit + 1):
+                needed = unit * (self.times - 1)
+                if len(line) < needed + unit:
+                    break
+                equal = bytes(map(operator.eq, line, line[unit:]))
+                if b'\x01' * needed in equal:
+                    return True
+        return False
+
+
+class LongLineScanner:
+    """Any single line of at least `length` characters, same as `(.){N,}`"""
+
+    folded = False
+
+    def __init__(self, length):
+        self.length = length
+
+    def search(self, text):
+        if len(text) < self.length:
+            return False
+        return any(len(line) >= self.length for line in text.split('\n'))
+
+
+class CharRunScanner:
+    """A run of `length` characters from a fixed set, same as `[...]{N,}`"""
+
+    folded = False
+
+    def __init__(self, chars, length):
+        # Map the set onto \x00 and push any real \x00 out of the way
+        self._table = str.maketrans({char: '\x00' for char in chars} | {'\x00': '\x01'})
+        self._needle = '\x00' * length
+        self._chars = frozenset(chars)
+
+    def search(self, text):
+        if self._chars.isdisjoint(text):
+            return False
+        return self._needle in text.translate(self._table)
+
+
+class FollowedByScanner:
+    """`first.*second` without the backtracking
+
+    Per line, the earliest end of a `first` match is found with one
+    overlapping scan, then `second` is searched once from there.
+    """
+
+    # Matches words, so it runs on folded text like the keyword index
+    folded = True
+
+    def __init__(self, first, second, flags=0):
+        self._first = re.compile(f'(?=({first}))', flags)
+        self._second = re.compile(second, flags)
+
+    def search(self, text):
+        for line in text.split('\n'):
+            earliest = None
+            for match in self._first.finditer(line):
+                if earliest is not None and match.start() >= earliest:
+                    break
+                if earliest is None or match.end(1) < earliest:
+                    earliest = match.end(1)
+            if earliest is not None and self._second.search(line, earliest):
+                return True
+        return False
+
+
+def _split_top_level(pattern, separator='.*'):
+    """Split a pattern on `separator` outside groups, classes and escapes"""
+    parts = []
+    depth = 0
+    in_class = False
+    start = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and pattern.startswith(separator, index):
+            parts.append(pattern[start:index])
+            index += len(separator)
+            start = index
+            continue
+        index += 1
+    parts.append(pattern[start:])
+    return parts
+
+
+def compile_scanner(pattern, flags=0):
+    """Return a linear-time scanner equivalent to `pattern`, or None"""
+    match = _REPEATED_UNIT.match(pattern)
+    if match:
+        return RepeatScanner(int(match.group(1)), int(match.group(2)) + 1)
+
+    match = _REPEATED_CHAR.match(pattern)
+    if match:
+        return RepeatScanner(1, int(match.group(1)) + 1)
+
+    match = _LONG_LINE.match(pattern)
+    if match:
+        return LongLineScanner(int(match.group(1)))
+
+    match = _CHAR_RUN.match(pattern)
+    if match:
+        return CharRunScanner(match.group(1), int(match.group(2)))
+
+    parts = _split_top_level(pattern)
+    if len(parts) == 2 and all(parts) and not any('\\1' in part or '.*' in part for part in parts):
+        try:
+            return FollowedByScanner(parts[0], parts[1], flags)
+        except re.error:
+            return None
+
+    return None
@@ -0,0 +1,145 @@
+import math
+import time
+from collections import deque
+
+from utils.expiring_map import ExpiringMap
+
+
+class SpamThresholds:
+    """Per-guild limits for the rate-based spam checks"""
+
+    __slots__ = ('burst_count', 'burst_seconds', 'repeat_count', 'repeat_seconds', 'mention_count', 'mention_seconds')
+
+    FIELDS = __slots__
+    MAX_SECONDS = 300
+    # burst_count sizes a ring per tracked user, so it is capped like the windows
+    MAX_COUNT = 100
+
+    def __init__(self, burst_count=5, burst_seconds=5.0, repeat_count=3, repeat_seconds=60.0,
+                 mention_count=10, mention_seconds=30.0):
+        self.burst_count = int(burst_count)
+        self.burst_seconds = float(burst_seconds)
+        self.repeat_count = int(repeat_count)
+        self.repeat_seconds = float(repeat_seconds)
+        self.mention_count = int(mention_count)
+        self.mention_seconds = float(mention_seconds)
+
+    def replace(self, field, value):
+        """Return a copy with one field changed, raises ValueError if it is out of range"""
+        if field not in self.FIELDS:
+            raise ValueError(f'unknown threshold {field}')
+        if not math.isfinite(value):
+            raise ValueError(f'{field} must be a finite number')
+        values = self.to_dict()
+        values[field] = value
+        thresholds = SpamThresholds(**values)
+        if thresholds.burst_count < 2 or thresholds.repeat_count < 2 or thresholds.mention_count < 1:
+            raise ValueError('counts must be at least 2 (mentions at least 1)')
+        for name in ('burst_count', 'repeat_count', 'mention_count'):
+            if getattr(thresholds, name) > self.MAX_COUNT:
+                raise ValueError(f'counts must be at most {self.MAX_COUNT}')
+        for name in ('burst_seconds', 'repeat_seconds', 'mention_seconds'):
+            if not 0 < getattr(thresholds, name) <= self.MAX_SECONDS:
+                raise ValueError(f'windows must be between 0 and {self.MAX_SECONDS} seconds')
+        return thresholds
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class _UserWindow:
+    """Fixed-size rate state for one user in one channel"""
+
+    __slots__ = ('times', 'content_hash', 'repeats', 'repeat_started', 'tokens', 'refilled_at', 'flagged_until')
+
+    def __init__(self, burst_count, mention_count, now):
+        self.times = deque(maxlen=burst_count)
+        self.content_hash = None
+        self.repeats = 0
+        self.repeat_started = now
+        self.tokens = float(mention_count)
+        self.refilled_at = now
+        self.flagged_until = [0.0, 0.0, 0.0]
+
+
+class SpamDetector:
+    """Per-user, per-channel message rate checks with O(1) updates
+
+    Each (channel, user) pair keeps a ring of its last `burst_count`
+    message times, the hash and count of its current run of identical
+    messages, and a token bucket for mentions. Pairs that go quiet for
+    `track_seconds` are dropped and the total is capped, so memory is
+    fixed per tracked user and bounded overall.
+    """
+
+    BURST, REPEAT, MENTIONS = range(3)
+    KINDS = ('burst', 'repeat', 'mentions')
+
+    def __init__(self, defaults=None, track_seconds=SpamThresholds.MAX_SECONDS, maxsize=50000, clock=time.monotonic):
+        self.defaults = defaults or SpamThresholds()
+        self.guild_thresholds = {}
+        self.clock = clock
+        self._windows = ExpiringMap(ttl=track_seconds, maxsize=maxsize, clock=clock)
+
+    def thresholds_for(self, guild_id):
+        return self.guild_thresholds.get(guild_id, self.defaults)
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _flag(self, window, kind, now, cooldown):
+        """Report each kind once per window instead of on every message"""
+        if window.flagged_until[kind] > now:
+            return False
+        window.flagged_until[kind] = now + cooldown
+        return True
+
+    def check(self, guild_id, channel_id, user_id, content, mentions=0, limits=None):
+        """Record a message and return a list of (kind, detail) for the checks it trips"""
+        limits = limits or self.thresholds_for(guild_id)
+        now = self.clock()
+        key = (channel_id, user_id)
+
+        window = self._windows.get(key)
+        if window is None or window.times.maxlen != limits.burst_count:
+            window = _UserWindow(limits.burst_count, limits.mention_count, now)
+        # Re-inserting refreshes the entry's TTL
+        self._windows[key] = window
+
+        flags = []
+
+        # Burst: the ring is full and its oldest entry is inside the window
+        times = window.times
+        times.append(now)
+        if len(times) == times.maxlen and now - times[0] <= limits.burst_seconds:
+            if self._flag(window, self.BURST, now, limits.burst_seconds):
+                flags.append(('burst', f'{len(times)} messages in {now - times[0]:.1f}s'))
+
+        # Repeats: consecutive identical messages inside the window. Messages
+        # with no text (images, stickers) are not repeats of each other and
+        # end the current run
+        text = content.strip().lower()
+        if not text:
+            window.content_hash = None
+            window.repeats = 0
+        elif hash(text) == window.content_hash and now - window.repeat_started <= limits.repeat_seconds:
+            window.repeats += 1
+        else:
+            window.content_hash = hash(text)
+            window.repeats = 1
+            window.repeat_started = now
+        if window.repeats >= limits.repeat_count:
+            if self._flag(window, self.REPEAT, now, limits.repeat_seconds):
+                flags.append(('repeat', f'same message sent {window.repeats} times'))
+
+        # Mentions: token bucket refilled at mention_count per mention_seconds
+        if mentions:
+            rate = limits.mention_count / limits.mention_seconds
+            window.tokens = min(limits.mention_count, window.tokens + (now - window.refilled_at) * rate)
+            window.refilled_at = now
+            window.tokens -= mentions
+            if window.tokens < 0:
+                if self._flag(window, self.MENTIONS, now, limits.mention_seconds):
+                    flags.append(('mentions', f'over {limits.mention_count} mentions in {limits.mention_seconds:.0f}s'))
+
+        return flags
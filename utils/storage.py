@@ -0,0 +1,505 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from utils.jsonfile import load_json
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS warnings (
+    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    warning_id INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    moderator_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_warnings_member ON warnings (guild_id, user_id, warning_id);
+
+CREATE TABLE IF NOT EXISTS captchas (
+    user_id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS verification_cooldowns (
+    user_id INTEGER PRIMARY KEY,
+    cooldown_end REAL NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cooldowns_expiry ON verification_cooldowns (cooldown_end);
+
+CREATE TABLE IF NOT EXISTS spam_thresholds (
+    guild_id INTEGER PRIMARY KEY,
+    burst_count INTEGER NOT NULL,
+    burst_seconds REAL NOT NULL,
+    repeat_count INTEGER NOT NULL,
+    repeat_seconds REAL NOT NULL,
+    mention_count INTEGER NOT NULL,
+    mention_seconds REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rule_configs (
+    guild_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rule_settings (
+    guild_id INTEGER NOT NULL,
+    rule_num INTEGER NOT NULL,
+    enabled INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, rule_num)
+);
+
+CREATE TABLE IF NOT EXISTS rule_patterns (
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    rule_num INTEGER NOT NULL,
+    quarantined INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, kind, pattern)
+);
+
+CREATE TABLE IF NOT EXISTS rule_exemptions (
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    target_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, kind, target_id)
+);
+'''
+
+
+class Storage:
+    """SQLite storage for the bot's per-user state
+
+    The database runs in WAL mode and every query is executed on one
+    dedicated thread, so callers on the event loop only ever await.
+    """
+
+    def __init__(self, path='data/police_agent.db'):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+        self._conn = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # Connection lifecycle
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def open(self):
+        """Open the database and create missing tables"""
+        await self._run(self._open)
+
+    async def close(self):
+        """Close the database and stop the storage thread"""
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _checkpoint(self):
+        return self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+
+    async def checkpoint(self):
+        """Fold the write-ahead log back into the database file and truncate it"""
+        return await self._run(self._checkpoint)
+
+    # Generic helpers
+
+    def _execute(self, sql, params):
+        cursor = self._conn.execute(sql, params)
+        return cursor.rowcount, cursor.lastrowid
+
+    def _fetchone(self, sql, params):
+        row = self._conn.execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def _fetchall(self, sql, params):
+        return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _transaction(self, func, *args):
+        self._conn.execute('BEGIN')
+        try:
+            result = func(self._conn, *args)
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+        return result
+
+    async def execute(self, sql, params=()):
+        """Execute a statement, returns (rowcount, lastrowid)"""
+        return await self._run(self._execute, sql, params)
+
+    async def fetchone(self, sql, params=()):
+        """Fetch a single row as a dict"""
+        return await self._run(self._fetchone, sql, params)
+
+    async def fetchall(self, sql, params=()):
+        """Fetch all rows as a list of dicts"""
+        return await self._run(self._fetchall, sql, params)
+
+    async def transaction(self, func, *args):
+        """Run `func(conn, *args)` inside a single transaction on the storage thread"""
+        return await self._run(self._transaction, func, *args)
+
+    # Warnings
+
+    @staticmethod
+    def _warning_row(row):
+        return {
+            'id': row['warning_id'],
+            'reason': row['reason'],
+            'moderator_id': row['moderator_id'],
+            'timestamp': row['created_at'],
+            'guild_id': row['guild_id']
+        }
+
+    @staticmethod
+    def _add_warning(conn, guild_id, user_id, moderator_id, reason, timestamp, warning_id):
+        if warning_id is None:
+            row = conn.execute(
+                'SELECT COALESCE(MAX(warning_id), 0) + 1 FROM warnings WHERE guild_id = ? AND user_id = ?',
+                (guild_id, user_id)
+            ).fetchone()
+            warning_id = row[0]
+        conn.execute(
+            'INSERT INTO warnings (guild_id, user_id, warning_id, reason, moderator_id, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (guild_id, user_id, warning_id, reason, moderator_id, timestamp)
+        )
+        return warning_id
+
+    async def add_warning(self, guild_id, user_id, moderator_id, reason, timestamp=None, warning_id=None):
+        """Store a warning and return its per-user warning ID
+
+        The ID is allocated from the table unless the caller passes one.
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        return await self.transaction(self._add_warning, guild_id, user_id, moderator_id, reason, timestamp, warning_id)
+
+    async def all_warnings(self):
+        """Get every stored warning as (guild_id, user_id, warning) tuples, oldest first"""
+        rows = await self.fetchall('SELECT * FROM warnings ORDER BY guild_id, user_id, warning_id')
+        return [(row['guild_id'], row['user_id'], self._warning_row(row)) for row in rows]
+
+    async def get_user_warnings(self, guild_id, user_id):
+        """Get all warnings for a user in a guild, oldest first"""
+        rows = await self.fetchall(
+            'SELECT * FROM warnings WHERE guild_id = ? AND user_id = ? ORDER BY warning_id',
+            (guild_id, user_id)
+        )
+        return [self._warning_row(row) for row in rows]
+
+    async def clear_warnings(self, guild_id, user_id):
+        """Delete all warnings for a user, returns how many were removed"""
+        rowcount, _ = await self.execute(
+            'DELETE FROM warnings WHERE guild_id = ? AND user_id = ?',
+            (guild_id, user_id)
+        )
+        return rowcount
+
+    async def delete_warning(self, guild_id, user_id, warning_id):
+        """Delete a single warning, returns False if it did not exist"""
+        rowcount, _ = await self.execute(
+            'DELETE FROM warnings WHERE guild_id = ? AND user_id = ? AND warning_id = ?',
+            (guild_id, user_id, warning_id)
+        )
+        return rowcount > 0
+
+    # Captchas
+
+    async def get_captcha(self, user_id):
+        """Get a user's pending captcha, or None"""
+        return await self.fetchone('SELECT * FROM captchas WHERE user_id = ?', (user_id,))
+
+    async def pending_captchas(self):
+        """Get every pending captcha"""
+        return await self.fetchall('SELECT * FROM captchas')
+
+    async def set_captcha(self, user_id, code, attempts=0, max_attempts=3, created_at=None):
+        """Create or replace a user's pending captcha"""
+        created_at = created_at or datetime.now().isoformat()
+        await self.execute(
+            'INSERT OR REPLACE INTO captchas (user_id, code, attempts, max_attempts, created_at) VALUES (?, ?, ?, ?, ?)',
+            (user_id, code, attempts, max_attempts, created_at)
+        )
+
+    async def delete_captcha(self, user_id):
+        """Delete a user's pending captcha"""
+        rowcount, _ = await self.execute('DELETE FROM captchas WHERE user_id = ?', (user_id,))
+        return rowcount > 0
+
+    async def count_captchas(self):
+        """Count pending captchas"""
+        row = await self.fetchone('SELECT COUNT(*) AS total FROM captchas')
+        return row['total']
+
+    # Verification cooldowns
+
+    async def get_cooldown(self, user_id):
+        """Get a user's cooldown end as an epoch timestamp, or None"""
+        row = await self.fetchone('SELECT cooldown_end FROM verification_cooldowns WHERE user_id = ?', (user_id,))
+        return row['cooldown_end'] if row else None
+
+    async def active_cooldowns(self, now):
+        """Get (user_id, cooldown_end) for every cooldown that has not ended yet"""
+        rows = await self.fetchall(
+            'SELECT user_id, cooldown_end FROM verification_cooldowns WHERE cooldown_end > ?',
+            (now,)
+        )
+        return [(row['user_id'], row['cooldown_end']) for row in rows]
+
+    async def set_cooldown(self, user_id, cooldown_end, added_at):
+        """Create or replace a user's cooldown"""
+        await self.execute(
+            'INSERT OR REPLACE INTO verification_cooldowns (user_id, cooldown_end, added_at) VALUES (?, ?, ?)',
+            (user_id, cooldown_end, added_at)
+        )
+
+    async def delete_cooldown(self, user_id):
+        """Delete a user's cooldown"""
+        rowcount, _ = await self.execute('DELETE FROM verification_cooldowns WHERE user_id = ?', (user_id,))
+        return rowcount > 0
+
+    async def delete_expired_cooldowns(self, now):
+        """Delete every cooldown that ended before `now`, returns how many were removed"""
+        rowcount, _ = await self.execute('DELETE FROM verification_cooldowns WHERE cooldown_end <= ?', (now,))
+        return rowcount
+
+    async def count_active_cooldowns(self, now):
+        """Count cooldowns that have not ended yet"""
+        row = await self.fetchone('SELECT COUNT(*) AS total FROM verification_cooldowns WHERE cooldown_end > ?', (now,))
+        return row['total']
+
+    # Spam thresholds
+
+    async def all_spam_thresholds(self):
+        """Get every guild's spam thresholds as {guild_id: {field: value}}"""
+        rows = await self.fetchall('SELECT * FROM spam_thresholds')
+        return {row.pop('guild_id'): row for row in rows}
+
+    async def set_spam_thresholds(self, guild_id, thresholds):
+        """Create or replace a guild's spam thresholds from a {field: value} dict"""
+        columns = ', '.join(thresholds)
+        placeholders = ', '.join('?' for _ in thresholds)
+        await self.execute(
+            f'INSERT OR REPLACE INTO spam_thresholds (guild_id, {columns}) VALUES (?, {placeholders})',
+            (guild_id, *thresholds.values())
+        )
+
+    async def delete_spam_thresholds(self, guild_id):
+        """Reset a guild to the default spam thresholds"""
+        rowcount, _ = await self.execute('DELETE FROM spam_thresholds WHERE guild_id = ?', (guild_id,))
+        return rowcount > 0
+
+    # Rule configs
+
+    @staticmethod
+    def _rule_config(conn, guild_id):
+        row = conn.execute('SELECT version FROM rule_configs WHERE guild_id = ?', (guild_id,)).fetchone()
+        config = {
+            'version': row[0] if row else 0,
+            'disabled': set(),
+            'keywords': {},
+            'regexes': {},
+            'quarantined': {},
+            'removed_keywords': set(),
+            'exempt_channels': set(),
+            'exempt_roles': set()
+        }
+        for rule_num, in conn.execute('SELECT rule_num FROM rule_settings WHERE guild_id = ? AND enabled = 0', (guild_id,)):
+            config['disabled'].add(rule_num)
+        for kind, pattern, rule_num, quarantined in conn.execute(
+            'SELECT kind, pattern, rule_num, quarantined FROM rule_patterns WHERE guild_id = ? ORDER BY rowid',
+            (guild_id,)
+        ):
+            if kind == 'removed':
+                config['removed_keywords'].add(pattern)
+            elif quarantined:
+                config['quarantined'][pattern] = rule_num
+            else:
+                config['keywords' if kind == 'keyword' else 'regexes'].setdefault(rule_num, []).append(pattern)
+        for kind, target_id in conn.execute('SELECT kind, target_id FROM rule_exemptions WHERE guild_id = ?', (guild_id,)):
+            config[f'exempt_{kind}s'].add(target_id)
+        return config
+
+    @classmethod
+    def _all_rule_configs(cls, conn):
+        guild_ids = [row[0] for row in conn.execute('SELECT guild_id FROM rule_configs')]
+        return {guild_id: cls._rule_config(conn, guild_id) for guild_id in guild_ids}
+
+    @classmethod
+    def _update_rule_config(cls, conn, guild_id, sql, params):
+        return cls._apply_rule_changes(conn, guild_id, [(sql, params)])
+
+    @staticmethod
+    def _apply_rule_changes(conn, guild_id, statements):
+        if sum(conn.execute(sql, params).rowcount for sql, params in statements) <= 0:
+            return None
+        conn.execute(
+            'INSERT INTO rule_configs (guild_id, version) VALUES (?, 1) '
+            'ON CONFLICT (guild_id) DO UPDATE SET version = version + 1',
+            (guild_id,)
+        )
+        return conn.execute('SELECT version FROM rule_configs WHERE guild_id = ?', (guild_id,)).fetchone()[0]
+
+    async def get_rule_config(self, guild_id):
+        """Get a guild's rule config, with version 0 if it never changed anything"""
+        return await self.transaction(self._rule_config, guild_id)
+
+    async def all_rule_configs(self):
+        """Get every stored rule config as {guild_id: config}"""
+        return await self.transaction(self._all_rule_configs)
+
+    async def update_rule_config(self, guild_id, sql, params=()):
+        """Run one change to a guild's rule tables and bump its version
+
+        Returns the new version, or None if the statement changed nothing.
+        """
+        return await self.transaction(self._update_rule_config, guild_id, sql, params)
+
+    async def set_rule_enabled(self, guild_id, rule_num, enabled):
+        """Turn one rule on or off for a guild"""
+        return await self.update_rule_config(
+            guild_id,
+            'INSERT OR REPLACE INTO rule_settings (guild_id, rule_num, enabled) VALUES (?, ?, ?)',
+            (guild_id, rule_num, int(enabled))
+        )
+
+    async def add_rule_pattern(self, guild_id, kind, rule_num, pattern):
+        """Flag a keyword or regex under a rule, moving it and lifting any quarantine if it was already set"""
+        return await self.update_rule_config(
+            guild_id,
+            'INSERT OR REPLACE INTO rule_patterns (guild_id, kind, pattern, rule_num) VALUES (?, ?, ?, ?)',
+            (guild_id, kind, pattern, rule_num)
+        )
+
+    async def remove_rule_pattern(self, guild_id, kind, pattern):
+        """Delete a keyword or regex, returns None if it was not set"""
+        return await self.update_rule_config(
+            guild_id,
+            'DELETE FROM rule_patterns WHERE guild_id = ? AND kind = ? AND pattern = ?',
+            (guild_id, kind, pattern)
+        )
+
+    async def set_rule_keyword(self, guild_id, rule_num, keyword):
+        """Flag a keyword under a rule, taking it over from any other rule and undoing a removal"""
+        return await self.transaction(self._apply_rule_changes, guild_id, [
+            ("DELETE FROM rule_patterns WHERE guild_id = ? AND kind = 'removed' AND pattern = ?", (guild_id, keyword)),
+            (
+                "INSERT OR REPLACE INTO rule_patterns (guild_id, kind, pattern, rule_num) VALUES (?, 'keyword', ?, ?)",
+                (guild_id, keyword, rule_num)
+            )
+        ])
+
+    async def remove_rule_keyword(self, guild_id, keyword, builtin=False):
+        """Stop flagging a keyword, returns None if it was not flagged
+
+        A built-in keyword is remembered as removed, so the base table
+        no longer flags it in this guild.
+        """
+        statements = [("DELETE FROM rule_patterns WHERE guild_id = ? AND kind = 'keyword' AND pattern = ?", (guild_id, keyword))]
+        if builtin:
+            statements.append((
+                "INSERT OR IGNORE INTO rule_patterns (guild_id, kind, pattern, rule_num) VALUES (?, 'removed', ?, 0)",
+                (guild_id, keyword)
+            ))
+        return await self.transaction(self._apply_rule_changes, guild_id, statements)
+
+    async def quarantine_rule_pattern(self, guild_id, pattern):
+        """Keep a regex that overran its time budget but stop running it"""
+        return await self.update_rule_config(
+            guild_id,
+            "UPDATE rule_patterns SET quarantined = 1 WHERE guild_id = ? AND kind = 'regex' AND pattern = ? AND quarantined = 0",
+            (guild_id, pattern)
+        )
+
+    async def add_rule_exemption(self, guild_id, kind, target_id):
+        """Exempt a channel or role from rule monitoring, returns None if it already was"""
+        return await self.update_rule_config(
+            guild_id,
+            'INSERT OR IGNORE INTO rule_exemptions (guild_id, kind, target_id) VALUES (?, ?, ?)',
+            (guild_id, kind, target_id)
+        )
+
+    async def remove_rule_exemption(self, guild_id, kind, target_id):
+        """Stop exempting a channel or role, returns None if it was not exempt"""
+        return await self.update_rule_config(
+            guild_id,
+            'DELETE FROM rule_exemptions WHERE guild_id = ? AND kind = ? AND target_id = ?',
+            (guild_id, kind, target_id)
+        )
+
+    # Legacy JSON import
+
+    @staticmethod
+    def _import_json(conn, data_dir):
+        captcha_data = load_json(os.path.join(data_dir, 'captcha_data.json'), {})
+        conn.executemany(
+            'INSERT OR IGNORE INTO captchas (user_id, code, attempts, max_attempts, created_at) VALUES (?, ?, ?, ?, ?)',
+            [
+                (int(user_id), data['code'], data.get('attempts', 0), data.get('max_attempts', 3),
+                 data.get('created_at') or datetime.now().isoformat())
+                for user_id, data in captcha_data.items()
+            ]
+        )
+
+        cooldown_data = load_json(os.path.join(data_dir, 'verification_cooldown.json'), {})
+        conn.executemany(
+            'INSERT OR IGNORE INTO verification_cooldowns (user_id, cooldown_end, added_at) VALUES (?, ?, ?)',
+            [
+                (int(user_id), datetime.fromisoformat(data['cooldown_end']).timestamp(),
+                 datetime.fromisoformat(data.get('added_at', data['cooldown_end'])).timestamp())
+                for user_id, data in cooldown_data.items()
+            ]
+        )
+
+        warnings_data = load_json(os.path.join(data_dir, 'warnings.json'), {})
+        conn.executemany(
+            'INSERT INTO warnings (guild_id, user_id, warning_id, reason, moderator_id, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (int(guild_id), int(user_id), warning['id'], warning['reason'], warning['moderator_id'], warning['timestamp'])
+                for guild_id, users in warnings_data.items()
+                for user_id, warnings in users.items()
+                for warning in warnings
+            ]
+        )
+
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('json_imported_at', ?)",
+            (datetime.now().isoformat(),)
+        )
+        return len(captcha_data), len(cooldown_data), sum(len(users) for users in warnings_data.values())
+
+    async def import_legacy_json(self, data_dir='data'):
+        """One-shot import of captcha_data.json, verification_cooldown.json and warnings.json
+
+        Returns None if the import already ran, otherwise a tuple with the
+        number of captchas, cooldowns and warned users imported.
+        """
+        row = await self.fetchone("SELECT value FROM meta WHERE key = 'json_imported_at'")
+        if row is not None:
+            return None
+        return await self.transaction(self._import_json, data_dir)
@@ -0,0 +1,56 @@
+def _common_prefix(a, b):
+    """Length of the common prefix, found by comparing slices instead of characters"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(a, b, limit):
+    """Length of the common suffix, at most `limit`"""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def changed_span(before, after):
+    """(start, end) of the part of `after` that differs from `before`
+
+    Trims the common prefix and suffix, so every change lands inside one
+    span. A pure deletion gives an empty span at the point where text
+    was removed.
+    """
+    prefix = _common_prefix(before, after)
+    suffix = _common_suffix(before, after, min(len(before), len(after)) - prefix)
+    return prefix, len(after) - suffix
+
+
+def edit_window(before, after, margin=64):
+    """The slice of `after` around what changed, widened by `margin` and out to whole words
+
+    Returns a pair of windows, the one in `before` and the one in `after`,
+    so callers can tell whether a match was already there before the edit.
+    """
+    start, end = changed_span(before, after)
+    removed_end = len(before) - (len(after) - end)
+
+    def widen(text, start, end):
+        start = max(0, start - margin)
+        end = min(len(text), end + margin)
+        # Never cut a word in half, or its tail could match as a word of its own
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        return text[start:end]
+
+    return widen(before, start, removed_end), widen(after, start, end)
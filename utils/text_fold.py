@@ -0,0 +1,81 @@
+import os
+import unicodedata
+from functools import lru_cache
+
+# Characters that render as nothing and are used to split words apart
+ZERO_WIDTH = (
+    '\u00ad\u034f\u061c\u115f\u1160\u180e\u200b\u200c\u200d\u200e\u200f'
+    '\u2060\u2061\u2062\u2063\u2064\u3164\ufeff\uffa0'
+    + ''.join(map(chr, range(0xfe00, 0xfe10)))
+)
+
+# Look-alikes from other scripts that compatibility decomposition leaves alone
+CONFUSABLES = {
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'с': 'c', 'ԁ': 'd', 'е': 'e', 'һ': 'h', 'н': 'h', 'і': 'i', 'ј': 'j', 'к': 'k',
+    'м': 'm', 'п': 'n', 'о': 'o', 'р': 'p', 'ԛ': 'q', 'г': 'r', 'ѕ': 's', 'т': 't', 'у': 'y', 'ԝ': 'w',
+    'х': 'x', 'ь': 'b',
+    # Greek
+    'α': 'a', 'β': 'b', 'ϲ': 'c', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+    # Latin variants
+    'ɑ': 'a', 'ɡ': 'g', 'ı': 'i', 'ȷ': 'j', 'ł': 'l', 'ø': 'o', 'đ': 'd', 'ħ': 'h', 'ŧ': 't',
+}
+
+# Leetspeak, only for characters that are not also used for their own meaning in rules
+LEET = {'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'}
+
+# Unicode blocks worth folding: Latin, Greek, Cyrillic, letterlike and enclosed
+# letters, fullwidth forms, mathematical alphanumerics and enclosed supplements
+_RANGES = (
+    (0x00a0, 0x0530),
+    (0x1d00, 0x1fff),
+    (0x2070, 0x2200),
+    (0x2460, 0x2500),
+    (0xff00, 0xfff0),
+    (0x1d400, 0x1d800),
+    (0x1f100, 0x1f200),
+)
+
+
+def _fold_char(char):
+    """What one character folds to, before the table is built"""
+    decomposed = unicodedata.normalize('NFKD', char).lower()
+    base = ''.join(part for part in decomposed if not unicodedata.combining(part))
+    return ''.join(CONFUSABLES.get(part, part) for part in base)
+
+
+def build_table():
+    """The translation table behind `fold`, built once at import"""
+    table = {}
+    for start, stop in _RANGES:
+        for codepoint in range(start, stop):
+            char = chr(codepoint)
+            if unicodedata.combining(char):
+                table[codepoint] = None
+                continue
+            folded = _fold_char(char)
+            if folded != char and folded.isascii():
+                table[codepoint] = folded.translate(str.maketrans(LEET)) or None
+
+    for char, folded in CONFUSABLES.items():
+        table[ord(char)] = folded
+    # Regional indicator symbols, 🇦 to 🇿
+    for offset in range(26):
+        table[0x1f1e6 + offset] = chr(ord('a') + offset)
+    for char in ZERO_WIDTH:
+        table[ord(char)] = None
+    table.update(str.maketrans(LEET))
+    return table
+
+
+TABLE = build_table()
+
+
+@lru_cache(maxsize=int(os.getenv('TEXT_FOLD_CACHE_SIZE', '4096')))
+def fold(text):
+    """Lowercased `text` with look-alikes, leetspeak and invisible characters folded to plain ASCII
+
+    One str.translate pass. Pass text that is already lowercased.
+    """
+    return text.translate(TABLE)